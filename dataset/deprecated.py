@@ -90,9 +90,9 @@ class WordEmbeddingsAndHyponymyDatasetWithNonHyponymyRelation(WordEmbeddingsAndH
 
     def __iter__(self):
 
-        for batch_hyponymy_b in self._hyponymy_dataloader:
+        for idx_hyponymy in self._hyponymy_dataloader:
             # remove hyponymy pairs which is not encodable
-            batch_hyponymy = [sample for sample in batch_hyponymy_b if self.is_encodable_all(sample["hyponym"], sample["hypernym"])]
+            batch_hyponymy = self._take_encodable_hyponymy_samples(idx_hyponymy)
             if len(batch_hyponymy) == 0:
                 continue
 
@@ -1,15 +1,51 @@
 #!/usr/bin/env python
 # -*- coding:utf-8 -*-
 
-from typing import List, Dict, Optional, Union
-import random
+import os
+import hashlib
+from typing import List, Dict, Optional, Union, Tuple
 
-from torch.utils.data import Dataset, DataLoader
+import torch
+from torch.utils.data import Dataset, IterableDataset, DataLoader, get_worker_info
 import numpy as np
 
 from .word_embeddings import AbstractWordEmbeddingsDataset
 from .lexical_knowledge import HyponymyDataset, WordNetHyponymyDataset
 from .taxonomy import BasicTaxonomy, WordNetTaxonomy
+from .matrix_cache import compute_fingerprint
+
+
+def _relation_to_tensors(relation) -> Optional[Tuple[torch.Tensor, ...]]:
+    # (index, ..., value) rows -> (index tensor, ..., value tensor). same format as CodeLengthPredictionLoss.collate_tuples()
+    arry_relation = np.asarray(relation, dtype=np.float64)
+    if arry_relation.ndim != 2:
+        return None
+    n_index_columns = arry_relation.shape[1] - 1
+    lst_t_idx = [torch.from_numpy(arry_relation[:,col].astype(np.int64)) for col in range(n_index_columns)]
+    t_values = torch.from_numpy(arry_relation[:,-1].astype(np.float32))
+    return (*lst_t_idx, t_values)
+
+
+def _collate_minibatch(batch):
+    # minibatch is already built by the dataset, and its embeddings are the tensor that dataloader can pin.
+    # relations are converted to tensors on the worker process so that loss layers don't have to unpack the tuples.
+    # original rows are kept as they are.
+    for field_name in ("hyponymy_relation", "non_hyponymy_relation", "entity_depth"):
+        if field_name in batch:
+            t_relation = _relation_to_tensors(batch[field_name])
+            if t_relation is not None:
+                batch[field_name + "_tensors"] = t_relation
+    return batch
+
+def _init_worker(worker_id: int):
+    # each worker must draw different random samples.
+    worker_info = get_worker_info()
+    seed = worker_info.seed % (2**32)
+    np.random.seed(seed)
+    dataset = worker_info.dataset
+    if isinstance(dataset, IterableWordEmbeddingsAndHyponymyDataset):
+        dataset = dataset.dataset
+    dataset._rng = np.random.default_rng(seed)
 
 
 class WordEmbeddingsAndHyponymyDataset(Dataset):
@@ -17,8 +53,15 @@ class WordEmbeddingsAndHyponymyDataset(Dataset):
     def __init__(self, word_embeddings_dataset: AbstractWordEmbeddingsDataset, hyponymy_dataset: HyponymyDataset,
                  embedding_batch_size: int, hyponymy_batch_size: int,
                  entity_depth_information: Optional[str] = None,
-                 verbose: bool = False, **kwargs_hyponymy_dataloader):
-
+                 verbose: bool = False,
+                 encodable_mask_cache_dir: Optional[str] = None,
+                 reuse_embedding_buffer: bool = False, **kwargs_hyponymy_dataloader):
+        """
+        :param encodable_mask_cache_dir: directory that stores whether each hyponymy pair is encodable or not. DEFAULT: no cache.
+        :param reuse_embedding_buffer: write embeddings into the preallocated (pinned if cuda is available) tensor instead of allocating every minibatch.
+            returned embeddings are overwritten by the next minibatch, so consume it before requesting the next one.
+            it is ignored on the dataloader worker processes.
+        """
 
         assert embedding_batch_size >= 2*hyponymy_batch_size, f"`embedding_batch_size` must be two times larger than `hyponymy_batch_size`."
         available_values = ("both","hypernym","hyponym","diff","lca",None)
@@ -31,8 +74,12 @@ class WordEmbeddingsAndHyponymyDataset(Dataset):
 
         self._embedding_batch_size = embedding_batch_size
         self._hyponymy_batch_size = hyponymy_batch_size
-        self._hyponymy_dataloader = DataLoader(hyponymy_dataset, collate_fn=lambda v:v, batch_size=hyponymy_batch_size, **kwargs_hyponymy_dataloader)
+        # number of minibatches: ceil(n_hyponymy / hyponymy_batch_size)
+        self._len = (self._n_hyponymy + hyponymy_batch_size - 1) // hyponymy_batch_size
+        # it yields the indices of hyponymy pairs so that the precomputed encodable mask can be applied.
+        self._hyponymy_dataloader = DataLoader(torch.arange(self._n_hyponymy), batch_size=hyponymy_batch_size, **kwargs_hyponymy_dataloader)
         self._verbose = verbose
+        self._rng = np.random.default_rng()
 
         self._entity_depth_information = entity_depth_information
 
@@ -47,11 +94,20 @@ class WordEmbeddingsAndHyponymyDataset(Dataset):
         else:
             raise NotImplementedError(f"unsupported hyponymy dataset type: {type(hyponymy_dataset)}")
 
-        # hyponymy sample order
+        # hyponymy sample order. it is placed on shared memory so that shuffling also takes effect on dataloader workers.
         n_hyponymy = len(self._hyponymy_dataset)
-        self._sample_order = list(range(n_hyponymy))
+        self._sample_order = torch.arange(n_hyponymy).share_memory_()
         self.shuffle_hyponymy_dataset()
 
+        # encodable hyponymy pairs are examined only once.
+        self._encodable_mask = torch.from_numpy(self._build_encodable_mask(cache_dir=encodable_mask_cache_dir))
+
+        if reuse_embedding_buffer:
+            self._embedding_buffer = torch.empty((embedding_batch_size, word_embeddings_dataset.n_dim), dtype=torch.float32,
+                                                 pin_memory=torch.cuda.is_available())
+        else:
+            self._embedding_buffer = None
+
     def verify_batch_sizes(self):
 
         n_embeddings = len(self._word_embeddings_dataset)
@@ -77,46 +133,120 @@ class WordEmbeddingsAndHyponymyDataset(Dataset):
     def is_encodable_all(self, *tokens):
         return all([self._word_embeddings_dataset.is_encodable(token) for token in tokens])
 
+    def _hyponymy_samples_digest(self) -> str:
+        # digest of the raw sample strings that are actually loaded, hence filter and subset() are taken into account.
+        return hashlib.md5("\n".join(self._hyponymy_dataset._lst_samples).encode("utf-8")).hexdigest()
+
+    def _encodable_mask_cache_path(self, cache_dir: str) -> str:
+        # file name is keyed by both the embeddings model (path, size, modification time and options) and the loaded hyponymy pairs.
+        # note that builtin hash() can't be used because it is randomized on each process.
+        embeddings = self._word_embeddings_dataset
+        hyponymy = self._hyponymy_dataset
+        fingerprint_embeddings = compute_fingerprint([], source=embeddings.source_fingerprint(), n_embeddings=self._n_embeddings,
+                                                     enable_phrase_composition=getattr(embeddings, "_enable_phrase_composition", None))
+        fingerprint_hyponymy = compute_fingerprint([], samples=self._hyponymy_samples_digest(), transform=type(hyponymy.transform).__name__,
+                                                   columns=hyponymy._columns, delimiter=hyponymy._delimiter,
+                                                   lowercase=hyponymy._lowercase, replace_whitespace=hyponymy._replace_whitespace)
+        file_name = f"enc_{fingerprint_embeddings}_{fingerprint_hyponymy}.npy"
+        return os.path.join(cache_dir, file_name)
+
+    def _build_encodable_mask(self, cache_dir: Optional[str] = None) -> np.ndarray:
+        """
+        examines whether both hyponym and hypernym of each hyponymy pair are encodable or not.
+
+        :param cache_dir: if specified, the result is saved (or loaded if exists) as the bit-packed array.
+        :return: boolean mask; (n_hyponymy,)
+        """
+        path = None
+        if cache_dir is not None:
+            path = self._encodable_mask_cache_path(cache_dir)
+            if os.path.exists(path):
+                return np.unpackbits(np.load(path, mmap_mode="r"), count=self._n_hyponymy).astype(bool)
+
+        mask = np.fromiter((self.is_encodable_all(sample["hyponym"], sample["hypernym"]) for sample in self._hyponymy_dataset),
+                           dtype=bool, count=self._n_hyponymy)
+        if path is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            np.save(path, np.packbits(mask))
+        return mask
+
+    def _take_encodable_hyponymy_samples(self, idx_hyponymy: torch.Tensor):
+        # take hyponymy pairs of the specified indices except which is not encodable
+        idx_hyponymy = idx_hyponymy[self._encodable_mask[idx_hyponymy]]
+        if len(idx_hyponymy) == 0:
+            return []
+        return self._hyponymy_dataset[idx_hyponymy]
+
+    def _sample_without_replacement(self, size: int, population_size: int, oversampling_rate: float = 1.3) -> np.ndarray:
+        """
+        samples `size` distinct integers from [0, population_size) uniformly at random.
+        unlike rng.choice(replace=False), it doesn't allocate O(population_size) buffer.
+
+        :param size: number of samples. it must not exceed `population_size`.
+        :param population_size: number of candidates.
+        :param oversampling_rate: draws `size*oversampling_rate` integers at once so that duplicates are compensated in a single iteration.
+        """
+        if size*4 > population_size:
+            # sampling ratio is high; permutation is cheaper than rejecting many duplicates.
+            return self._rng.permutation(population_size)[:size]
+
+        arry_samples = np.empty((0,), dtype=np.int64)
+        while len(arry_samples) < size:
+            n_draw = int(np.ceil((size - len(arry_samples)) * oversampling_rate))
+            arry_draws = np.concatenate((arry_samples, self._rng.integers(0, population_size, size=n_draw)))
+            # keep the first occurrences in drawing order. taking the smallest ones would bias the samples.
+            _, arry_idx_first = np.unique(arry_draws, return_index=True)
+            arry_samples = arry_draws[np.sort(arry_idx_first)]
+        return arry_samples[:size]
+
+    def _is_embedding_buffer_available(self, n_tokens: int) -> bool:
+        # on the worker processes, minibatch is sent to the main process asynchronously. so the buffer can't be reused.
+        if (self._embedding_buffer is None) or (get_worker_info() is not None):
+            return False
+        return n_tokens <= self._embedding_buffer.shape[0]
+
     def _create_batch_from_hyponymy_samples(self, batch_hyponymy: List[Dict[str,Union[str,float]]]):
 
-        # take tokens from hyponymy pairs
-        set_tokens = set()
-        iter_hyponyms = (hyponymy["hyponym"] for hyponymy in batch_hyponymy)
-        iter_hypernyms = (hyponymy["hypernym"] for hyponymy in batch_hyponymy)
-        set_tokens.update(iter_hyponyms)
-        set_tokens.update(iter_hypernyms)
+        # hyponymy pairs as parallel arrays: hypernyms, hyponyms and distances
+        n_hyponymy = len(batch_hyponymy)
+        arry_hypernyms = np.array([hyponymy["hypernym"] for hyponymy in batch_hyponymy], dtype=object)
+        arry_hyponyms = np.array([hyponymy["hyponym"] for hyponymy in batch_hyponymy], dtype=object)
+        arry_distances = np.array([hyponymy["distance"] for hyponymy in batch_hyponymy], dtype=np.float64)
+
+        # take tokens from hyponymy pairs: [hyper_0, hyper_1, ..., hypo_0, hypo_1, ...]
+        arry_pair_tokens, arry_pair_inverse = np.unique(np.concatenate((arry_hypernyms, arry_hyponyms)), return_inverse=True)
 
         # take remaining tokens randomly from word embeddings dataset vocabulary
-        n_diff = self._embedding_batch_size - len(set_tokens)
+        n_diff = self._embedding_batch_size - len(arry_pair_tokens)
         if n_diff > 0:
-            lst_index = np.random.randint(low=0, high=self._n_embeddings, size=n_diff)
+            lst_index = self._sample_without_replacement(size=min(n_diff, self._n_embeddings), population_size=self._n_embeddings)
             lst_tokens_from_embeddings = self._word_embeddings_dataset.indices_to_entities(lst_index)
-            # add to token set
-            set_tokens.update(lst_tokens_from_embeddings)
         else:
-            lst_tokens_from_embeddings = []
-
-        # create temporary token-to-index mapping
-        lst_tokens = list(set_tokens)
-        token_to_index = {token:idx for idx, token in enumerate(lst_tokens)}
-
-        # create embeddings
-        embeddings = tuple(self._word_embeddings_dataset[token]["embedding"] for token in lst_tokens)
-        n_dim = self._word_embeddings_dataset.n_dim
-        mat_embeddings = np.concatenate(embeddings, axis=0).reshape(-1, n_dim)
+            lst_tokens_from_embeddings = np.empty((0,), dtype=object)
+
+        # assign token index. (hypernym index, hyponym index) of each pair is obtained by composing two inverse mappings.
+        arry_tokens = np.concatenate((arry_pair_tokens, lst_tokens_from_embeddings))
+        arry_tokens_unique, arry_inverse = np.unique(arry_tokens, return_inverse=True)
+        lst_tokens = arry_tokens_unique.tolist()
+        arry_idx_pair_tokens = arry_inverse[arry_pair_inverse]
+        arry_idx_pairs = np.column_stack((arry_idx_pair_tokens[:n_hyponymy], arry_idx_pair_tokens[n_hyponymy:]))
+
+        # create embeddings as the tensor regardless of the buffer. transform (if any) must be applied to each sample.
+        if self._word_embeddings_dataset.transform is None:
+            if self._is_embedding_buffer_available(n_tokens=len(lst_tokens)):
+                mat_embeddings = self._word_embeddings_dataset.get_embeddings_tensor(lst_tokens, out=self._embedding_buffer[:len(lst_tokens)])
+            else:
+                mat_embeddings = self._word_embeddings_dataset.get_embeddings_tensor(lst_tokens)
+        else:
+            mat_embeddings = torch.from_numpy(np.stack([self._word_embeddings_dataset[token]["embedding"] for token in lst_tokens]).astype(np.float32, copy=False))
 
-        # create hyponymy relations
-        iter_idx_hypo = map(token_to_index.get, (hyponymy["hyponym"] for hyponymy in batch_hyponymy))
-        iter_idx_hyper = map(token_to_index.get, (hyponymy["hypernym"] for hyponymy in batch_hyponymy))
-        iter_hyponymy_score = (hyponymy["distance"] for hyponymy in batch_hyponymy)
-        lst_hyponymy_relation = [tup for tup in zip(iter_idx_hyper, iter_idx_hypo, iter_hyponymy_score)]
+        # create hyponymy relations: (n_hyponymy, 3) array of (hypernym index, hyponym index, hyponymy score)
+        arry_hyponymy_relation = np.column_stack((arry_idx_pairs, arry_distances))
 
         # create entity depth information
         if self._entity_depth_information is not None:
             lst_entity_depth_info = []
-            for hyponymy in batch_hyponymy:
-                idx_hypo = token_to_index[hyponymy["hyponym"]]
-                idx_hyper = token_to_index[hyponymy["hypernym"]]
+            for hyponymy, (idx_hyper, idx_hypo) in zip(batch_hyponymy, arry_idx_pairs):
                 pos = hyponymy.get("pos", None)
                 depth_hypo = self._taxonomy.depth(hyponymy["hyponym"], offset=1, part_of_speech=pos)
                 depth_hyper = self._taxonomy.depth(hyponymy["hypernym"], offset=1, part_of_speech=pos)
@@ -141,7 +271,7 @@ class WordEmbeddingsAndHyponymyDataset(Dataset):
         batch = {
             "embedding": mat_embeddings,
             "entity": lst_tokens,
-            "hyponymy_relation": lst_hyponymy_relation,
+            "hyponymy_relation": arry_hyponymy_relation,
             "hyponymy_relation_raw": batch_hyponymy
         }
         if self._entity_depth_information is not None:
@@ -152,42 +282,68 @@ class WordEmbeddingsAndHyponymyDataset(Dataset):
         return batch
 
     def shuffle_hyponymy_dataset(self):
-        random.shuffle(self._sample_order)
+        n_hyponymy = len(self._sample_order)
+        self._sample_order.copy_(self._sample_order[torch.randperm(n_hyponymy)])
+
+    def create_dataloader(self, num_workers: int = 4, pin_memory: Optional[bool] = None, prefetch_factor: int = 2,
+                          persistent_workers: bool = True, **kwargs_dataloader) -> DataLoader:
+        """
+        creates the dataloader that builds minibatches on the background worker processes.
+        embeddings are returned as (pinned) tensor.
+
+        :param num_workers: number of worker processes. zero means that minibatch is built on the main process.
+        :param pin_memory: use pinned memory or not. DEFAULT: True if cuda is available.
+        :param prefetch_factor: number of minibatches prefetched by each worker.
+        :param persistent_workers: keep workers alive across epochs so that embeddings model is not copied every epoch.
+        """
+        pin_memory = torch.cuda.is_available() if pin_memory is None else pin_memory
+        if num_workers > 0:
+            kwargs_dataloader.update(prefetch_factor=prefetch_factor, persistent_workers=persistent_workers,
+                                     worker_init_fn=_init_worker)
+        dataloader = DataLoader(self, batch_size=None, shuffle=False, collate_fn=_collate_minibatch,
+                                num_workers=num_workers, pin_memory=pin_memory, **kwargs_dataloader)
+        return dataloader
 
     def __iter__(self):
 
-        for batch_hyponymy_b in self._hyponymy_dataloader:
-            # remove hyponymy pairs which is not encodable
-            batch_hyponymy = [sample for sample in batch_hyponymy_b if self.is_encodable_all(sample["hyponym"], sample["hypernym"])]
-            if len(batch_hyponymy) == 0:
+        for idx_hyponymy in self._hyponymy_dataloader:
+            batch = self._create_batch_from_hyponymy_indices(idx_hyponymy)
+            if batch is None:
                 continue
 
-            batch = self._create_batch_from_hyponymy_samples(batch_hyponymy=batch_hyponymy)
-
             yield batch
 
+    def _create_batch_from_hyponymy_indices(self, idx_hyponymy: torch.Tensor):
+        # returns None if none of the hyponymy pairs is encodable
+        batch_hyponymy = self._take_encodable_hyponymy_samples(idx_hyponymy)
+        if len(batch_hyponymy) == 0:
+            return None
+
+        batch = self._create_batch_from_hyponymy_samples(batch_hyponymy=batch_hyponymy)
+
+        return batch
+
+    def _create_batch_from_index(self, idx):
+        # minibatch of the shuffled sample order. returns None if none of the hyponymy pairs in the minibatch is encodable
+        n_idx_min = self._hyponymy_batch_size * idx
+        n_idx_max = self._hyponymy_batch_size * (idx+1)
+        return self._create_batch_from_hyponymy_indices(self._sample_order[n_idx_min:n_idx_max])
+
     def __getitem__(self, idx):
 
         while True:
-            n_idx_min = self._hyponymy_batch_size * idx
-            n_idx_max = self._hyponymy_batch_size * (idx+1)
-            idx_hyponymy = self._sample_order[n_idx_min:n_idx_max]
-            batch_hyponymy_b = self._hyponymy_dataset[idx_hyponymy]
-            # remove hyponymy pairs which is not encodable
-            batch_hyponymy = [sample for sample in batch_hyponymy_b if self.is_encodable_all(sample["hyponym"], sample["hypernym"])]
-            if len(batch_hyponymy) == 0:
+            batch = self._create_batch_from_index(idx)
+            if batch is None:
                 idx += 1
                 continue
 
-            batch = self._create_batch_from_hyponymy_samples(batch_hyponymy=batch_hyponymy)
-
             return batch
 
     def n_samples(self):
-        return self._embedding_batch_size * int(np.ceil(len(self._hyponymy_dataset) / self._hyponymy_batch_size))
+        return self._embedding_batch_size * self._len
 
     def __len__(self):
-        return int(np.ceil(len(self._hyponymy_dataset) / self._hyponymy_batch_size))
+        return self._len
 
 
 class WordEmbeddingsAndHyponymyDatasetWithNonHyponymyRelation(WordEmbeddingsAndHyponymyDataset):
@@ -201,11 +357,15 @@ class WordEmbeddingsAndHyponymyDatasetWithNonHyponymyRelation(WordEmbeddingsAndH
                  limit_hyponym_candidates_within_minibatch: bool = False,
                  split_hyponymy_and_non_hyponymy: bool = True,
                  entity_depth_information: Optional[str] = None,
-                 verbose: bool = False, **kwargs_hyponymy_dataloader):
+                 verbose: bool = False,
+                 encodable_mask_cache_dir: Optional[str] = None,
+                 reuse_embedding_buffer: bool = False, **kwargs_hyponymy_dataloader):
 
         super().__init__(word_embeddings_dataset, hyponymy_dataset,
                          embedding_batch_size, hyponymy_batch_size,
                          entity_depth_information = entity_depth_information,
+                         encodable_mask_cache_dir=encodable_mask_cache_dir,
+                         reuse_embedding_buffer=reuse_embedding_buffer,
                          verbose=False, **kwargs_hyponymy_dataloader)
 
         assert non_hyponymy_batch_size % hyponymy_batch_size == 0, f"`non_hyponymy_batch_size` must be a multiple of `hyponymy_batch_size`."
@@ -234,6 +394,10 @@ class WordEmbeddingsAndHyponymyDatasetWithNonHyponymyRelation(WordEmbeddingsAndH
             assert self._non_hyponymy_multiple % n_mod == 0, \
                 f"When you specify multiple `non_hyponymy_relation_target`, `non_hyponymy_batch_size` must be a multiple of the `hyponymy_batch_size`"
 
+        if not limit_hyponym_candidates_within_minibatch:
+            if ("hyponym" in non_hyponymy_relation_target) or ("hypernym" in non_hyponymy_relation_target):
+                self._build_non_hyponymy_index()
+
         if verbose:
             self.verify_batch_sizes()
 
@@ -284,22 +448,37 @@ class WordEmbeddingsAndHyponymyDatasetWithNonHyponymyRelation(WordEmbeddingsAndH
         else:
             break_probability = 0.8
 
+        # sample non-hyponymy counterparts of all hyponymy pairs at once, unless candidates are limited.
+        lst_pos = [hyponymy.get("pos", None) for hyponymy in batch_hyponymy]
+        if (set_candidates is None) and ("hyponym" in self._non_hyponymy_relation_target):
+            lst_hypernyms = [hyponymy["hypernym"] for hyponymy in batch_hyponymy]
+            lst_sampled_hyponyms = self._sample_non_hyponymy_entities(lst_hypernyms, lst_pos, size=size_per_sample)
+        if (set_candidates is None) and ("hypernym" in self._non_hyponymy_relation_target):
+            lst_hyponyms = [hyponymy["hyponym"] for hyponymy in batch_hyponymy]
+            lst_sampled_hypernyms = self._sample_non_hyponymy_entities(lst_hyponyms, lst_pos, size=size_per_sample)
+
         # create non-hyponymy relation
         lst_non_hyponymy_samples = []
-        for hyponymy in batch_hyponymy:
+        for idx, hyponymy in enumerate(batch_hyponymy):
             hyper = hyponymy["hypernym"]
             hypo = hyponymy["hyponym"]
             pos = hyponymy.get("pos", None)
             lst_tup_sample_b = []
             if "hyponym" in self._non_hyponymy_relation_target:
-                lst_tup_sample_b_swap_hypo = self._taxonomy.sample_random_hyponyms(entity=hyper, candidates=set_candidates, size=size_per_sample,
-                                                            exclude_hypernyms=self._exclude_reverse_hyponymy_from_non_hyponymy_relation,
-                                                            part_of_speech=pos)
+                if set_candidates is None:
+                    lst_tup_sample_b_swap_hypo = [(hyper, hypo_s, self._non_hyponymy_score(hyper, hypo_s, pos)) for hypo_s in lst_sampled_hyponyms[idx]]
+                else:
+                    lst_tup_sample_b_swap_hypo = self._taxonomy.sample_random_hyponyms(entity=hyper, candidates=set_candidates, size=size_per_sample,
+                                                                exclude_hypernyms=self._exclude_reverse_hyponymy_from_non_hyponymy_relation,
+                                                                part_of_speech=pos)
                 lst_tup_sample_b.extend(lst_tup_sample_b_swap_hypo)
             if "hypernym" in self._non_hyponymy_relation_target:
-                lst_tup_sample_b_swap_hyper = self._taxonomy.sample_random_hypernyms(entity=hypo, candidates=set_candidates, size=size_per_sample,
-                                                            exclude_hypernyms=self._exclude_reverse_hyponymy_from_non_hyponymy_relation,
-                                                            part_of_speech=pos)
+                if set_candidates is None:
+                    lst_tup_sample_b_swap_hyper = [(hyper_s, hypo, self._non_hyponymy_score(hyper_s, hypo, pos)) for hyper_s in lst_sampled_hypernyms[idx]]
+                else:
+                    lst_tup_sample_b_swap_hyper = self._taxonomy.sample_random_hypernyms(entity=hypo, candidates=set_candidates, size=size_per_sample,
+                                                                exclude_hypernyms=self._exclude_reverse_hyponymy_from_non_hyponymy_relation,
+                                                                part_of_speech=pos)
                 lst_tup_sample_b.extend(lst_tup_sample_b_swap_hyper)
             if "co-hyponym" in self._non_hyponymy_relation_target:
                 lst_tup_sample_b_swap_hyper_to_co_hyper = self._taxonomy.sample_random_co_hyponyms(hypernym=hyper, hyponym=hypo,
@@ -309,7 +488,7 @@ class WordEmbeddingsAndHyponymyDatasetWithNonHyponymyRelation(WordEmbeddingsAndH
 
             # if distance is specified, then overwrite all samples with specified value.
             if self._non_hyponymy_relation_distance is not None:
-                update_function = lambda tup: tup[2] + (self._non_hyponymy_relation_distance,)
+                update_function = lambda tup: tup[:2] + (self._non_hyponymy_relation_distance,)
                 lst_tup_sample_b = list(map(update_function, lst_tup_sample_b))
 
             # convert them to dictionary format
@@ -322,6 +501,29 @@ class WordEmbeddingsAndHyponymyDatasetWithNonHyponymyRelation(WordEmbeddingsAndH
 
         return lst_non_hyponymy_samples
 
+    def _build_non_hyponymy_index(self):
+        # encode the taxonomy for each part-of-speech in advance so that dataloader workers can share it.
+        for pos in getattr(self._taxonomy, "entity_types", (None,)):
+            self._taxonomy.non_hyponymy_index(exclude_hypernyms=self._exclude_reverse_hyponymy_from_non_hyponymy_relation,
+                                              part_of_speech=pos)
+
+    def _sample_non_hyponymy_entities(self, entities: List[str], lst_pos: List[Optional[str]], size: int) -> List[Tuple[str]]:
+        lst_sampled = [tuple()] * len(entities)
+        # iterate in a fixed order so that the samples are reproducible under the fixed seed.
+        for pos in sorted(set(lst_pos), key=str):
+            lst_idx = [idx for idx, pos_i in enumerate(lst_pos) if pos_i == pos]
+            lst_sampled_pos = self._taxonomy.sample_non_hyponymy_batch(entities=[entities[idx] for idx in lst_idx], size=size,
+                                                                       exclude_hypernyms=self._exclude_reverse_hyponymy_from_non_hyponymy_relation,
+                                                                       part_of_speech=pos)
+            for idx, sampled in zip(lst_idx, lst_sampled_pos):
+                lst_sampled[idx] = sampled
+        return lst_sampled
+
+    def _non_hyponymy_score(self, hypernym: str, hyponym: str, pos: Optional[str] = None):
+        if self._non_hyponymy_relation_distance is not None:
+            return self._non_hyponymy_relation_distance
+        return self._taxonomy.hyponymy_score(hypernym=hypernym, hyponym=hyponym, part_of_speech=pos)
+
     def _create_swap_hyponymy_samples(self, batch_hyponymy: List[Dict[str,Union[str,float]]]):
         lst_swap_hyponymy_samples = []
         for hyponymy in batch_hyponymy:
@@ -347,93 +549,104 @@ class WordEmbeddingsAndHyponymyDatasetWithNonHyponymyRelation(WordEmbeddingsAndH
         return lst_swap_hyponymy_samples
 
     def _split_hyponymy_samples_and_non_hyponymy_samples(self, batch):
-        lst_hyponymy_relation = []
-        lst_hyponymy_relation_raw = []
-        lst_non_hyponymy_relation = []
-        lst_non_hyponymy_relation_raw = []
-        for relation, relation_raw  in zip(batch["hyponymy_relation"], batch["hyponymy_relation_raw"]):
-            distance = relation[2]
-            if distance > 0:
-                lst_hyponymy_relation.append(relation)
-                lst_hyponymy_relation_raw.append(relation_raw)
-            else:
-                lst_non_hyponymy_relation.append(relation)
-                lst_non_hyponymy_relation_raw.append(relation_raw)
+        arry_relation = batch["hyponymy_relation"]
+        lst_relation_raw = batch["hyponymy_relation_raw"]
 
-        batch["hyponymy_relation"] = lst_hyponymy_relation
-        batch["hyponymy_relation_raw"] = lst_hyponymy_relation_raw
-        batch["non_hyponymy_relation"] = lst_non_hyponymy_relation
-        batch["non_hyponymy_relation_raw"] = lst_non_hyponymy_relation_raw
+        # positive distance: hyponymy relation, otherwise: non-hyponymy relation
+        is_hyponymy = arry_relation[:,2] > 0
 
-        return batch
+        batch["hyponymy_relation"] = arry_relation[is_hyponymy]
+        batch["hyponymy_relation_raw"] = [relation_raw for relation_raw, flag in zip(lst_relation_raw, is_hyponymy) if flag]
+        batch["non_hyponymy_relation"] = arry_relation[~is_hyponymy]
+        batch["non_hyponymy_relation_raw"] = [relation_raw for relation_raw, flag in zip(lst_relation_raw, is_hyponymy) if not flag]
 
-    def __getitem__(self, idx):
+        return batch
 
-        while True:
-            n_idx_min = self._hyponymy_batch_size * idx
-            n_idx_max = self._hyponymy_batch_size * (idx+1)
+    def _create_batch_from_hyponymy_indices(self, idx_hyponymy: torch.Tensor):
 
-            # feed hyponymy relation from the hyponymy dataset
-            idx_hyponymy = self._sample_order[n_idx_min:n_idx_max]
-            batch_hyponymy_b = self._hyponymy_dataset[idx_hyponymy]
+        # feed hyponymy relation from the hyponymy dataset. hyponymy pairs which is not encodable are removed.
+        batch_hyponymy = self._take_encodable_hyponymy_samples(idx_hyponymy)
+        if len(batch_hyponymy) == 0:
+            return None
 
-            # remove hyponymy pairs which is not encodable
-            batch_hyponymy = [sample for sample in batch_hyponymy_b if self.is_encodable_all(sample["hyponym"], sample["hypernym"])]
-            if len(batch_hyponymy) == 0:
-                idx += 1
-                continue
+        # we randomly sample the non-hyponymy relation from the mini-batch
+        n_adjuster = len(self._non_hyponymy_relation_target)
+        size_per_sample = self._non_hyponymy_multiple // n_adjuster
+        batch_non_hyponymy_b = self._create_non_hyponymy_samples_from_hyponymy_samples(batch_hyponymy=batch_hyponymy,
+                                                                                     size_per_sample=size_per_sample)
 
-            # we randomly sample the non-hyponymy relation from the mini-batch
-            n_adjuster = len(self._non_hyponymy_relation_target)
-            size_per_sample = self._non_hyponymy_multiple // n_adjuster
-            batch_non_hyponymy_b = self._create_non_hyponymy_samples_from_hyponymy_samples(batch_hyponymy=batch_hyponymy,
-                                                                                         size_per_sample=size_per_sample)
+        # remove hyponymy pairs which is not encodable
+        batch_non_hyponymy = [sample for sample in batch_non_hyponymy_b if self.is_encodable_all(sample["hyponym"], sample["hypernym"])]
 
-            # remove hyponymy pairs which is not encodable
-            batch_non_hyponymy = [sample for sample in batch_non_hyponymy_b if self.is_encodable_all(sample["hyponym"], sample["hypernym"])]
+        # concat it
+        batch_hyponymy.extend(batch_non_hyponymy)
 
-            # concat it
-            batch_hyponymy.extend(batch_non_hyponymy)
+        # (optional) create swapped samples
+        if self._swap_hyponymy_relations:
+            batch_hyponymy_swap = self._create_swap_hyponymy_samples(batch_hyponymy=batch_hyponymy)
+            batch_hyponymy.extend(batch_hyponymy_swap)
 
-            # (optional) create swapped samples
-            if self._swap_hyponymy_relations:
-                batch_hyponymy_swap = self._create_swap_hyponymy_samples(batch_hyponymy=batch_hyponymy)
-                batch_hyponymy.extend(batch_hyponymy_swap)
+        # create (and format) a minibatch from both hyponymy samples and non-hyponymy samples
+        batch = self._create_batch_from_hyponymy_samples(batch_hyponymy=batch_hyponymy)
 
-            # create (and format) a minibatch from both hyponymy samples and non-hyponymy samples
-            batch = self._create_batch_from_hyponymy_samples(batch_hyponymy=batch_hyponymy)
+        # (optional) split hyponymy relation and non-hyponymy relation
+        if self._split_hyponymy_and_non_hyponymy:
+            batch = self._split_hyponymy_samples_and_non_hyponymy_samples(batch)
 
-            # (optional) split hyponymy relation and non-hyponymy relation
-            if self._split_hyponymy_and_non_hyponymy:
-                batch = self._split_hyponymy_samples_and_non_hyponymy_samples(batch)
+        return batch
 
-            return batch
 
-    def __iter__(self):
-
-        for batch_hyponymy_b in self._hyponymy_dataloader:
-            # remove hyponymy pairs which is not encodable
-            batch_hyponymy = [sample for sample in batch_hyponymy_b if self.is_encodable_all(sample["hyponym"], sample["hypernym"])]
-            if len(batch_hyponymy) == 0:
-                continue
+class IterableWordEmbeddingsAndHyponymyDataset(IterableDataset):
 
-            # we randomly sample the non-hyponymy relation from the mini-batch
-            n_adjuster = len(self._non_hyponymy_relation_target)
-            size_per_sample = self._non_hyponymy_multiple // n_adjuster
-            batch_non_hyponymy = self._create_non_hyponymy_samples_from_hyponymy_samples(batch_hyponymy=batch_hyponymy,
-                                                                                         size_per_sample=size_per_sample)
-            batch_hyponymy.extend(batch_non_hyponymy)
+    def __init__(self, dataset: WordEmbeddingsAndHyponymyDataset):
+        """
+        iterable version of the word embeddings and hyponymy dataset.
+        on the dataloader workers, minibatches are split into contiguous shards so that each worker builds its own minibatches.
+        call `dataset.shuffle_hyponymy_dataset()` on the main process to shuffle the samples at each epoch.
 
-            # (optional) create swapped samples
-            if self._swap_hyponymy_relations:
-                batch_hyponymy_swap = self._create_swap_hyponymy_samples(batch_hyponymy=batch_hyponymy)
-                batch_hyponymy.extend(batch_hyponymy_swap)
+        :param dataset: instance of WordEmbeddingsAndHyponymyDataset or its subclass.
+        """
+        self.dataset = dataset
 
-            # create (and format) a minibatch from both hyponymy samples and non-hyponymy samples
-            batch = self._create_batch_from_hyponymy_samples(batch_hyponymy=batch_hyponymy)
+    def _shard(self) -> Tuple[int, int]:
+        n_batches = len(self.dataset)
+        worker_info = get_worker_info()
+        if worker_info is None:
+            return 0, n_batches
+        n_batches_per_worker = -(-n_batches // worker_info.num_workers)
+        idx_begin = min(worker_info.id * n_batches_per_worker, n_batches)
+        idx_end = min(idx_begin + n_batches_per_worker, n_batches)
+        return idx_begin, idx_end
 
-            # (optional) split hyponymy relation and non-hyponymy relation
-            if self._split_hyponymy_and_non_hyponymy:
-                batch = self._split_hyponymy_samples_and_non_hyponymy_samples(batch)
+    def __getattr__(self, name):
+        # delegates unknown attributes such as `shuffle_hyponymy_dataset()` to the wrapped dataset.
+        # `dataset` itself is excluded to avoid infinite recursion during unpickling.
+        if name == "dataset":
+            raise AttributeError(name)
+        return getattr(self.dataset, name)
 
+    def __iter__(self):
+        idx_begin, idx_end = self._shard()
+        for idx in range(idx_begin, idx_end):
+            # empty minibatches are skipped within the shard so that no minibatch is shared across workers.
+            batch = self.dataset._create_batch_from_index(idx)
+            if batch is None:
+                continue
             yield batch
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def create_dataloader(self, num_workers: int = 4, pin_memory: Optional[bool] = None, prefetch_factor: int = 2,
+                          persistent_workers: bool = True, **kwargs_dataloader) -> DataLoader:
+        """
+        creates the dataloader that streams minibatches from the background worker processes.
+        arguments are identical to `WordEmbeddingsAndHyponymyDataset.create_dataloader()`.
+        """
+        pin_memory = torch.cuda.is_available() if pin_memory is None else pin_memory
+        if num_workers > 0:
+            kwargs_dataloader.update(prefetch_factor=prefetch_factor, persistent_workers=persistent_workers,
+                                     worker_init_fn=_init_worker)
+        dataloader = DataLoader(self, batch_size=None, collate_fn=_collate_minibatch,
+                                num_workers=num_workers, pin_memory=pin_memory, **kwargs_dataloader)
+        return dataloader
@@ -6,7 +6,9 @@ from __future__ import division
 from __future__ import print_function
 
 
-from typing import Optional, Dict, Set
+from typing import Optional, Dict, Set, Iterable
+
+import numpy as np
 
 
 class DictionaryFilter(object):
@@ -17,17 +19,39 @@ class DictionaryFilter(object):
         self._excludes = excludes
         assert (includes is not None) or (excludes is not None), f"you must specify either `includes` or `excludes` argument."
         assert (includes is None) or (excludes is None), f"you can't specify both `includes` and `excludes` at the same time."
+        # values as object arrays for batch evaluation, so that mixed or non-string values are compared as they are.
+        self._includes_array = None if includes is None else {field_name:np.array(list(values), dtype=object) for field_name, values in includes.items()}
+        self._excludes_array = None if excludes is None else {field_name:np.array(list(values), dtype=object) for field_name, values in excludes.items()}
 
-    def __call__(self, sample: Dict[str, str]):
-
+    @property
+    def field_names(self) -> Iterable[str]:
         if self._includes is not None:
-            for field_name, values in self._includes.items():
-                if sample[field_name] in values:
-                    return True
-            return False
-
-        if self._excludes is not None:
-            for field_name, values in self._excludes.items():
-                if sample[field_name] in values:
-                    return False
-            return True
\ No newline at end of file
+            return tuple(self._includes.keys())
+        else:
+            return tuple(self._excludes.keys())
+
+    def filter_batch(self, columns: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        evaluates the filter over multiple samples at once.
+
+        :param columns: dictionary of field name -> array of field values. every array must have the same length.
+        :return: boolean mask. True means the sample passes the filter.
+        """
+        n_sample = len(columns[next(iter(self.field_names))])
+
+        # either `includes` or `excludes` is specified. it is asserted in the constructor.
+        if self._includes_array is not None:
+            mask = np.zeros(n_sample, dtype=bool)
+            for field_name, values in self._includes_array.items():
+                mask |= np.isin(np.asarray(columns[field_name]), values)
+        else:
+            mask = np.ones(n_sample, dtype=bool)
+            for field_name, values in self._excludes_array.items():
+                mask &= ~np.isin(np.asarray(columns[field_name]), values)
+
+        return mask
+
+    def __call__(self, sample: Dict[str, str]):
+        # single sample is evaluated as the batch of size one, so that both methods share the same rule.
+        columns = {field_name:np.array([sample[field_name]], dtype=object) for field_name in self.field_names}
+        return bool(self.filter_batch(columns)[0])
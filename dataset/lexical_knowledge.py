@@ -8,6 +8,7 @@ from __future__ import print_function
 import os, sys, io
 from typing import Dict, List, Union, Callable, Optional, Any, Iterable
 import torch
+import numpy as np
 from torch.utils.data import Dataset
 from _collections import defaultdict
 
@@ -44,14 +45,21 @@ class HyponymyDataset(Dataset):
         return ret
 
     def _filter_samples(self, lst_samples, filter_function: Callable[[Any], bool]):
-        ret = []
+        lst_entries = []
         for s_entry in lst_samples:
             entry = self._preprocess(s_entry)
             if self.transform is not None:
                 entry = self.transform(entry)
+            lst_entries.append(entry)
 
-            if filter_function(entry):
-                ret.append(s_entry)
+        # filter that supports batch evaluation is applied to all samples at once.
+        if hasattr(filter_function, "filter_batch"):
+            columns = {field_name:np.array([entry[field_name] for entry in lst_entries], dtype=object) for field_name in filter_function.field_names}
+            mask = filter_function.filter_batch(columns)
+        else:
+            mask = [filter_function(entry) for entry in lst_entries]
+
+        ret = [s_entry for s_entry, is_valid in zip(lst_samples, mask) if is_valid]
         return ret
 
     def _apply(self, apply_column_name: str, apply_function: Callable, default_return_value: Optional[Any] = None):
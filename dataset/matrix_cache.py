@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import os
+import json
+import hashlib
+from typing import Tuple, Callable, Iterable, Optional
+
+import numpy as np
+
+# header of the cache file: magic bytes, hex digest of the fingerprint, then zero padding.
+_HEADER_MAGIC = b"MTXCACHE"
+_HEADER_SIZE = 64
+
+
+def compute_fingerprint(source_paths: Iterable[str], **options) -> str:
+    """
+    computes the fingerprint of the source files and the options which affect the content of the cache.
+    source files are identified by its absolute path, size and modification time, so that the files are not read.
+
+    :param source_paths: paths to the source files such as the embeddings model.
+    :param options: any json-serializable options.
+    :return: hex digest
+    """
+    lst_sources = []
+    for path in source_paths:
+        stat = os.stat(path)
+        lst_sources.append((os.path.abspath(path), stat.st_size, stat.st_mtime_ns))
+    s_fingerprint = json.dumps({"sources":lst_sources, "options":options}, sort_keys=True, default=str)
+    return hashlib.md5(s_fingerprint.encode("utf-8")).hexdigest()
+
+
+def _make_header(fingerprint: str) -> bytes:
+    header = _HEADER_MAGIC + fingerprint.encode("ascii")
+    assert len(header) <= _HEADER_SIZE, f"fingerprint is too long: {fingerprint}"
+    return header.ljust(_HEADER_SIZE, b"\0")
+
+
+def _is_valid_cache(path: str, n_bytes: int, header: bytes) -> bool:
+    if not os.path.exists(path):
+        return False
+    if os.path.getsize(path) != _HEADER_SIZE + n_bytes:
+        return False
+    with open(path, mode="rb") as ifs:
+        return ifs.read(_HEADER_SIZE) == header
+
+
+def open_matrix_cache(path: str, shape: Tuple[int, int], fill_function: Callable[[int, int], np.ndarray],
+                      fingerprint: Optional[str] = None, chunk_size: int = 100000) -> np.memmap:
+    """
+    opens the embeddings matrix cache as the read-only memory map.
+    cache file is (re-)created when it doesn't exist, or either its shape or fingerprint doesn't match with the specified one.
+
+    :param path: path to the cache file. it is the fixed-size header followed by the raw float32 array.
+    :param shape: (n_entities, n_dim)
+    :param fill_function: function that receives (begin, end) and returns the embeddings of the entities whose index is in [begin, end).
+    :param fingerprint: identifier of the embeddings model and its options. see `compute_fingerprint()`.
+    :param chunk_size: number of rows that are written at once.
+    """
+    n_rows, n_dim = shape
+    n_bytes = n_rows * n_dim * np.dtype(np.float32).itemsize
+    header = _make_header(compute_fingerprint([], shape=shape, fingerprint=fingerprint))
+    if not _is_valid_cache(path, n_bytes, header):
+        # header is left blank until the matrix is filled, so that the interrupted cache is never regarded as valid.
+        mat_cache = np.memmap(path, dtype=np.float32, mode="w+", offset=_HEADER_SIZE, shape=shape)
+        for begin in range(0, n_rows, chunk_size):
+            end = min(begin + chunk_size, n_rows)
+            mat_cache[begin:end] = fill_function(begin, end)
+        mat_cache.flush()
+        del mat_cache
+        with open(path, mode="r+b") as ofs:
+            ofs.write(header)
+
+    return np.memmap(path, dtype=np.float32, mode="r", offset=_HEADER_SIZE, shape=shape)
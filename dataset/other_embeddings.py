@@ -8,12 +8,15 @@ from __future__ import print_function
 import os, sys, io
 import argparse
 import warnings
+from typing import List, Optional, Iterable
 
 import numpy as np
 import torch
 from torch.utils.data import Dataset
 from wikipedia2vec.wikipedia2vec import Wikipedia2Vec
 
+from .matrix_cache import open_matrix_cache, compute_fingerprint
+
 
 class ToyEmbeddingsDataset(Dataset):
 
@@ -50,14 +53,23 @@ class ToyEmbeddingsDataset(Dataset):
 
 class Wikipedia2VecDataset(Dataset):
 
-    def __init__(self, path_wikipedia2vec: str, transform=None):
+    def __init__(self, path_wikipedia2vec: str, transform=None, path_matrix_cache: Optional[str] = None):
         warnings.warn("experimental dataset.")
 
         assert os.path.exists(path_wikipedia2vec), f"file not found: {path_wikipedia2vec}"
         self.model = Wikipedia2Vec.load(path_wikipedia2vec)
+        self._path_wikipedia2vec = path_wikipedia2vec
+        self._syn0 = self.model.syn0
+        if path_matrix_cache is not None:
+            self.build_matrix_cache(path_matrix_cache)
         self.transform = transform
-        self._idx_to_entity = {idx:entity for idx, entity in enumerate(self.model.dictionary.entities())}
-        self._n_sample = len(self._idx_to_entity)
+        # entity titles and syn0 row indices are stored as arrays so that both directions of lookup are cheap.
+        lst_entities = list(self.model.dictionary.entities())
+        self._titles = np.empty((len(lst_entities),), dtype=object)
+        self._titles[:] = [entity.title for entity in lst_entities]
+        self._syn0_indices = np.fromiter((entity.index for entity in lst_entities), dtype=np.int64, count=len(lst_entities))
+        self._entity_to_idx = {title:idx for idx, title in enumerate(self._titles)}
+        self._n_sample = len(self._titles)
 
     def __len__(self):
         return self._n_sample
@@ -67,16 +79,44 @@ class Wikipedia2VecDataset(Dataset):
         if torch.is_tensor(idx):
             idx = idx.tolist()
 
-        entity = self._idx_to_entity[idx]
-        embedding = self.model.get_vector(entity)
+        embedding = np.array(self._syn0[self._syn0_indices[idx]])
 
-        sample = {"entity":entity.title, "embedding":embedding}
+        sample = {"entity":self._titles[idx], "embedding":embedding}
 
         if self.transform is not None:
             sample = self.transform(sample)
 
         return sample
 
+    def build_matrix_cache(self, path: str):
+        """
+        saves the word and entity vectors (=syn0) as the memory-mapped file, then uses it instead of the in-memory copy.
+        if the cache file already exists and it is built from the same model, it is simply loaded.
+
+        :param path: path to the cache file.
+        """
+        syn0 = self.model.syn0
+        fill_function = lambda begin, end: syn0[begin:end]
+        fingerprint = compute_fingerprint([self._path_wikipedia2vec], class_name=self.__class__.__name__)
+        self._syn0 = open_matrix_cache(path, shape=syn0.shape, fill_function=fill_function, fingerprint=fingerprint)
+
+    def index_to_entity(self, index: int):
+        return self._titles[index]
+
+    def indices_to_entities(self, indices: Iterable[int]) -> np.ndarray:
+        return self._titles.take(np.asarray(indices, dtype=np.int64))
+
+    def get_embeddings(self, list_entities: List[str]) -> np.ndarray:
+        """
+        encodes the list of entity titles at once.
+
+        :param list_entities: list of entity titles.
+        :return: embeddings matrix; (len(list_entities), n_dim)
+        """
+        indices = np.fromiter((self._entity_to_idx[title] for title in list_entities), dtype=np.int64, count=len(list_entities))
+        indices = self._syn0_indices.take(indices)
+        return np.asarray(self._syn0.take(indices, axis=0))
+
     @property
     def n_dim(self):
         return self.model.train_params["dim_size"]
\ No newline at end of file
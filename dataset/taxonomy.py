@@ -11,11 +11,77 @@ from functools import lru_cache
 import warnings
 import networkx as nx
 import numpy as np
-import math
 import random
 
 from .lexical_knowledge import HyponymyDataset
 
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+    prange = range
+
+
+def _sample_non_hyponymy_kernel(query_ids, indptr, indices, n_nodes, size, seed, out):
+    """
+    samples `size` nodes for each query node, with replacement, from the nodes which are not adjacent to the query node.
+    indices[indptr[q]:indptr[q+1]] must be the sorted ids of the nodes adjacent to the query node q.
+    random number generator is seeded by `seed + i` for the i-th query so that the result doesn't depend on the thread scheduling.
+    rows of `out` are left untouched when the query node is unknown (=negative id) or no node can be sampled.
+    """
+    for i in prange(query_ids.shape[0]):
+        query_id = query_ids[i]
+        if query_id < 0:
+            continue
+        adjacent_ids = indices[indptr[query_id]:indptr[query_id+1]]
+        n_adjacent = adjacent_ids.shape[0]
+        if n_nodes - n_adjacent <= 0:
+            continue
+        np.random.seed(seed + i)
+        n_sampled = 0
+        while n_sampled < size:
+            node_id = np.random.randint(0, n_nodes)
+            pos = np.searchsorted(adjacent_ids, node_id)
+            if (pos < n_adjacent) and (adjacent_ids[pos] == node_id):
+                continue
+            out[i, n_sampled] = node_id
+            n_sampled += 1
+
+if njit is not None:
+    _sample_non_hyponymy_kernel = njit(parallel=True)(_sample_non_hyponymy_kernel)
+
+
+def _is_adjacent(query_ids, node_ids, indptr, indices):
+    """
+    vectorized binary search. returns whether node_ids[i] is in indices[indptr[query_ids[i]]:indptr[query_ids[i]+1]] or not.
+    """
+    if len(indices) == 0:
+        return np.zeros(node_ids.shape, dtype=np.bool_)
+    lo, hi = indptr[query_ids], indptr[query_ids+1]
+    end = hi
+    while True:
+        is_active = lo < hi
+        if not is_active.any():
+            break
+        mid = (lo + hi) // 2
+        is_less = indices[np.minimum(mid, len(indices)-1)] < node_ids
+        lo = np.where(is_active & is_less, mid + 1, lo)
+        hi = np.where(is_active & ~is_less, mid, hi)
+    return (lo < end) & (indices[np.minimum(lo, len(indices)-1)] == node_ids)
+
+
+def _sample_non_hyponymy_vectorized(query_ids, indptr, indices, n_nodes, size, out):
+    """
+    numpy version of `_sample_non_hyponymy_kernel`. it draws the samples of all query nodes at once.
+    every query node must be known and must have the nodes that can be sampled, otherwise it won't terminate.
+    """
+    rows = np.repeat(np.arange(len(query_ids)), size)
+    cols = np.tile(np.arange(size), len(query_ids))
+    while len(rows) > 0:
+        draws = np.random.randint(0, n_nodes, size=len(rows))
+        is_rejected = _is_adjacent(query_ids[rows], draws, indptr, indices)
+        out[rows[~is_rejected], cols[~is_rejected]] = draws[~is_rejected]
+        rows, cols = rows[is_rejected], cols[is_rejected]
 
 
 class BasicTaxonomy(object):
@@ -29,7 +95,6 @@ class BasicTaxonomy(object):
         self.build_directed_acyclic_graph(iter_hyponymy_pairs)
         iter_hyponymy_pairs = ((record["hypernym"], record["hyponym"]) for record in hyponymy_dataset)
         self.record_ancestors_and_descendants(iter_hyponymy_pairs)
-        self._random_number_generator = self._random_number_generator_iterator(max_value=self.n_nodes_max)
 
     @property
     def dag(self):
@@ -62,6 +127,7 @@ class BasicTaxonomy(object):
 
         self._dag = graph
         self._cache_root_nodes = {}
+        self._cache_non_hyponymy_index = {}
         self._nodes = tuple(graph.nodes)
 
     def record_ancestors_and_descendants(self, iter_hyponymy_pairs):
@@ -71,13 +137,6 @@ class BasicTaxonomy(object):
             self._trainset_ancestors[hyponym].add(hypernym)
             self._trainset_descendants[hypernym].add(hyponym)
 
-    def _random_number_generator_iterator(self, max_value: int):
-        seeds = np.arange(max_value)
-        while True:
-            np.random.shuffle(seeds)
-            for idx in seeds:
-                yield idx
-
     def _find_root_nodes(self, graph) -> Set[str]:
         hash_value = graph.__hash__() + graph.number_of_nodes()
         if hash_value in self._cache_root_nodes:
@@ -220,35 +279,115 @@ class BasicTaxonomy(object):
 
     def sample_non_hyponymy(self, entity, candidates: Optional[Iterable[str]] = None,
                             size: int = 1, exclude_hypernyms: bool = True) -> List[str]:
-        graph = self.dag
-        if entity not in graph:
+        node_to_id, arry_nodes, indptr, indices = self.non_hyponymy_index(exclude_hypernyms=exclude_hypernyms)
+        entity_id = node_to_id.get(entity, -1)
+        if entity_id < 0:
             return []
+        # sorted ids of hyponyms (and hypernyms) and the entity itself.
+        excluded_ids = indices[indptr[entity_id]:indptr[entity_id+1]]
+        n_nodes = len(arry_nodes)
+
+        if candidates is not None:
+            candidate_ids = np.unique(np.fromiter((node_to_id.get(candidate, -1) for candidate in candidates), dtype=np.int64))
+            candidate_ids = candidate_ids[candidate_ids >= 0]
+        elif len(excluded_ids) / n_nodes >= 0.9:
+            candidate_ids = np.arange(n_nodes)
+        else:
+            candidate_ids = None
 
-        if exclude_hypernyms:
-            non_candidates = self.hypernyms_and_hyponyms_and_self(entity)
+        # sampling with replacement
+        if candidate_ids is not None:
+            candidate_ids = candidate_ids[~np.isin(candidate_ids, excluded_ids, assume_unique=True)]
+            if len(candidate_ids) == 0:
+                return []
+            sampled_ids = candidate_ids[np.random.randint(0, len(candidate_ids), size=size)]
         else:
-            non_candidates = self.hyponyms_and_self(entity)
-        candidates = self.nodes if candidates is None else tuple(set(candidates).intersection(set(self.nodes)))
+            # rejection sampling. excluded nodes are less than 90%, so a few iterations are enough.
+            sampled_ids = np.zeros((0,), dtype=np.int64)
+            while len(sampled_ids) < size:
+                draws = np.random.randint(0, n_nodes, size=2*(size - len(sampled_ids)))
+                pos = np.minimum(np.searchsorted(excluded_ids, draws), max(len(excluded_ids)-1, 0))
+                is_excluded = (excluded_ids[pos] == draws) if len(excluded_ids) > 0 else np.zeros_like(draws, dtype=bool)
+                sampled_ids = np.concatenate((sampled_ids, draws[~is_excluded]))
+            sampled_ids = sampled_ids[:size]
+
+        return tuple(arry_nodes.take(sampled_ids).tolist())
+
+    def non_hyponymy_index(self, exclude_hypernyms: bool = True, **kwargs):
+        """
+        encodes the taxonomy into integer arrays in CSR format. it is used for sampling non-hyponymy relations.
+        indices[indptr[i]:indptr[i+1]] is the sorted ids of the nodes that must not be sampled for the node nodes[i].
 
-        if len(candidates) - len(non_candidates) <= 0:
-            return []
-        elif len(non_candidates)/len(candidates) >= 0.9:
-            candidates = tuple(set(candidates) - non_candidates)
-        elif len(candidates) < size:
-            candidates = (candidates)*(math.ceil(size/len(candidates)))
+        @param exclude_hypernyms: exclude hypernyms in addition to the hyponyms and the node itself.
+        @return: tuple of (node-to-id mapping, nodes, indptr, indices)
+        """
+        key = (getattr(self, "ACTIVE_ENTITY_TYPE", None), exclude_hypernyms)
+        if key in self._cache_non_hyponymy_index:
+            return self._cache_non_hyponymy_index[key]
+
+        arry_nodes = np.empty((len(self.nodes),), dtype=object)
+        arry_nodes[:] = self.nodes
+        node_to_id = {node:node_id for node_id, node in enumerate(arry_nodes)}
+
+        lst_indices = []
+        for node in arry_nodes:
+            if exclude_hypernyms:
+                non_candidates = self.hypernyms_and_hyponyms_and_self(node)
+            else:
+                non_candidates = self.hyponyms_and_self(node)
+            ids = sorted(node_to_id[entity] for entity in non_candidates if entity in node_to_id)
+            lst_indices.append(np.array(ids, dtype=np.int64))
 
-        # sampling with replacement
-        sampled = tuple()
-        n_candidates = len(candidates)
-        for rnd_idx in self._random_number_generator:
-            sampled_new = candidates[rnd_idx % n_candidates]
-            if sampled_new in non_candidates:
-                continue
-            sampled = sampled + (sampled_new,)
-            if len(sampled) >= size:
-                break
+        indptr = np.zeros((len(arry_nodes)+1,), dtype=np.int64)
+        np.cumsum([len(ids) for ids in lst_indices], out=indptr[1:])
+        indices = np.concatenate(lst_indices) if len(lst_indices) > 0 else np.zeros((0,), dtype=np.int64)
+
+        ret = (node_to_id, arry_nodes, indptr, indices)
+        self._cache_non_hyponymy_index[key] = ret
+        return ret
 
-        return sampled
+    def sample_non_hyponymy_batch(self, entities: List[str], size: int = 1, exclude_hypernyms: bool = True, **kwargs) -> List[Tuple[str]]:
+        """
+        batch version of `sample_non_hyponymy` method. candidates are all nodes in the taxonomy.
+
+        @return: list of sampled entities for each entity. it is empty if the entity can't be sampled.
+        """
+        node_to_id, arry_nodes, indptr, indices = self.non_hyponymy_index(exclude_hypernyms=exclude_hypernyms)
+        n_nodes = len(arry_nodes)
+        query_ids = np.array([node_to_id.get(entity, -1) for entity in entities], dtype=np.int64)
+        if (size <= 0) or (n_nodes == 0):
+            return [tuple() for _ in entities]
+        sampled_ids = np.full((len(entities), size), -1, dtype=np.int64)
+
+        is_known = query_ids >= 0
+        n_excluded = np.zeros((len(entities),), dtype=np.int64)
+        n_excluded[is_known] = indptr[query_ids[is_known]+1] - indptr[query_ids[is_known]]
+        # same as `sample_non_hyponymy`: explicit candidates are used when most of the nodes are excluded.
+        is_dense = is_known & (n_excluded >= 0.9 * n_nodes)
+        idx_sparse = np.flatnonzero(is_known & ~is_dense)
+
+        # rejection sampling. excluded nodes are less than 90%, so a few iterations are enough.
+        if len(idx_sparse) > 0:
+            sampled_ids_sparse = np.empty((len(idx_sparse), size), dtype=np.int64)
+            if njit is not None:
+                seed = np.random.randint(0, 2**31 - len(idx_sparse))
+                _sample_non_hyponymy_kernel(query_ids[idx_sparse], indptr, indices, n_nodes, size, seed, sampled_ids_sparse)
+            else:
+                _sample_non_hyponymy_vectorized(query_ids[idx_sparse], indptr, indices, n_nodes, size, sampled_ids_sparse)
+            sampled_ids[idx_sparse] = sampled_ids_sparse
+
+        # sampling from explicit candidates.
+        for idx in np.flatnonzero(is_dense):
+            query_id = query_ids[idx]
+            excluded_ids = indices[indptr[query_id]:indptr[query_id+1]]
+            candidate_ids = np.setdiff1d(np.arange(n_nodes), excluded_ids, assume_unique=True)
+            if len(candidate_ids) > 0:
+                sampled_ids[idx] = candidate_ids[np.random.randint(0, len(candidate_ids), size=size)]
+
+        # either all or none of each row is filled.
+        is_sampled = sampled_ids[:,0] >= 0
+        sampled = arry_nodes.take(np.maximum(sampled_ids, 0))
+        return [tuple(row) if flag else tuple() for row, flag in zip(sampled, is_sampled)]
 
     def sample_random_hyponyms(self, entity: str,
                                candidates: Optional[Iterable[str]] = None,
@@ -339,7 +478,6 @@ class WordNetTaxonomy(BasicTaxonomy):
 
         self.build_directed_acyclic_graph(dict_iter_hyponymy_pairs)
         self.record_ancestors_and_descendants(dict_iter_trainset_pairs)
-        self._random_number_generator = self._random_number_generator_iterator(max_value=self.n_nodes_max)
 
     def build_directed_acyclic_graph(self, dict_iter_hyponymy_pairs: Dict[str, Iterable[Tuple[str, str]]]):
         self._dag = {}
@@ -352,6 +490,7 @@ class WordNetTaxonomy(BasicTaxonomy):
 
         self._active_entity_type = None
         self._cache_root_nodes = {}
+        self._cache_non_hyponymy_index = {}
         self._nodes = {entity_type:tuple(graph.nodes) for entity_type, graph in self._dag.items()}
 
     def record_ancestors_and_descendants(self, dict_iter_hyponymy_pairs):
@@ -390,6 +529,14 @@ class WordNetTaxonomy(BasicTaxonomy):
         self.ACTIVE_ENTITY_TYPE = kwargs.get("part_of_speech", None)
         return super().sample_random_hyponyms(entity, candidates, size, exclude_hypernyms)
 
+    def non_hyponymy_index(self, exclude_hypernyms: bool = True, **kwargs):
+        self.ACTIVE_ENTITY_TYPE = kwargs.get("part_of_speech", None)
+        return super().non_hyponymy_index(exclude_hypernyms)
+
+    def sample_non_hyponymy_batch(self, entities: List[str], size: int = 1, exclude_hypernyms: bool = True, **kwargs) -> List[Tuple[str]]:
+        self.ACTIVE_ENTITY_TYPE = kwargs.get("part_of_speech", None)
+        return super().sample_non_hyponymy_batch(entities, size, exclude_hypernyms)
+
     def sample_random_co_hyponyms(self, hypernym: str, hyponym: str, size: int = 1, break_probability: float = 0.5, **kwargs):
         self.ACTIVE_ENTITY_TYPE = kwargs.get("part_of_speech", None)
         return super().sample_random_co_hyponyms(hypernym, hyponym, size, break_probability)
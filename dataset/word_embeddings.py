@@ -13,12 +13,21 @@ import numpy as np
 import fasttext
 from gensim.models import KeyedVectors
 
+from .matrix_cache import open_matrix_cache, compute_fingerprint
+
 
 class AbstractWordEmbeddingsDataset(Dataset, metaclass=ABCMeta):
     _PHRASE_DELIMITER = "_"
+    _ENCODABLE_PHRASE_CACHE_SIZE = 1000000
     _idx_to_word = {}
+    _idx_to_entity_array = np.empty((0,), dtype=object)
     transform = None
     _entity_info = None
+    _matrix = None
+    _shared_matrix = None
+    # source files and options of the embeddings model. they are used to detect the stale cache.
+    _source_paths = ()
+    _source_options = {}
 
     def phrase_splitter(self, phrase: str):
         return self._mwe_tokenizer.tokenize(phrase.split(self._PHRASE_DELIMITER))
@@ -31,6 +40,70 @@ class AbstractWordEmbeddingsDataset(Dataset, metaclass=ABCMeta):
         it = multi_word_expressions()
         self._mwe_tokenizer = MWETokenizer(it)
 
+    def _init_entity_array(self):
+        # index-to-entity lookup table as an array, so that multiple indices can be converted at once.
+        if isinstance(self._idx_to_word, dict):
+            lst_entities = [self._idx_to_word[idx] for idx in range(len(self._idx_to_word))]
+        else:
+            lst_entities = list(self._idx_to_word)
+        self._idx_to_entity_array = np.empty((len(lst_entities),), dtype=object)
+        self._idx_to_entity_array[:] = lst_entities
+
+    def _init_encodable_phrase_cache(self):
+        # per-instance memo of `_is_encodable_phrase()`. unlike lru_cache on the method, it is released with the instance.
+        self._encodable_phrase_cache = {}
+
+    def build_matrix_cache(self, path: str):
+        """
+        stacks the embeddings of all entities into the (n_entities, n_dim) float32 matrix, then saves it as the memory-mapped file.
+        if the cache file already exists and it is built from the same model and options, it is simply loaded.
+
+        :param path: path to the cache file.
+        """
+        # embeddings must be computed from the model, not from the (possibly stale) cache.
+        self._matrix = None
+        self._shared_matrix = None
+        fill_function = lambda begin, end: self.get_embeddings(self.indices_to_entities(range(begin, end)).tolist())
+        self._matrix = open_matrix_cache(path, shape=(len(self), self.n_dim), fill_function=fill_function,
+                                         fingerprint=self.source_fingerprint())
+
+    def source_fingerprint(self) -> str:
+        """
+        identifier of the embeddings model and the options which affect the embeddings.
+        """
+        return compute_fingerprint(self._source_paths, class_name=self.__class__.__name__, **self._source_options)
+
+    def share_matrix_cache(self):
+        """
+        copies the embeddings matrix cache onto the shared memory.
+        then the dataloader workers refer to the same matrix even if they are spawned (not forked) processes.
+        """
+        assert self._matrix is not None, f"embeddings matrix cache is not available. call `build_matrix_cache()` first."
+        self._shared_matrix = torch.from_numpy(np.array(self._matrix)).share_memory_()
+        # memory-mapped file would be copied when the dataset is sent to the workers.
+        self._matrix = None
+
+    @property
+    def matrix_cache(self) -> Optional[Union[np.ndarray, torch.Tensor]]:
+        return self._matrix if self._shared_matrix is None else self._shared_matrix
+
+    def _entities_to_indices(self, list_entities: Collection[str]) -> np.ndarray:
+        # out-of-vocabulary entities are mapped to -1.
+        return np.fromiter((self._entity_to_idx.get(entity, -1) for entity in list_entities), dtype=np.int64, count=len(list_entities))
+
+    def _gather_embeddings(self, list_entities: Collection[str], matrix: Union[np.ndarray, torch.Tensor]) -> np.ndarray:
+        # gather in-vocabulary entities at once, then fill the remaining (=phrases) one by one.
+        indices = self._entities_to_indices(list_entities)
+        if torch.is_tensor(matrix):
+            mat_embeddings = matrix.index_select(0, torch.from_numpy(np.maximum(indices, 0))).numpy()
+        else:
+            mat_embeddings = np.asarray(matrix.take(np.maximum(indices, 0), axis=0))
+        for idx in np.flatnonzero(indices < 0):
+            embedding = self.encode(list_entities[idx])
+            assert embedding is not None, f"string `{list_entities[idx]}` cannot be encoded."
+            mat_embeddings[idx] = embedding
+        return mat_embeddings
+
     @abstractmethod
     def encode_phrase(self, phrase) -> Optional[np.ndarray]:
         pass
@@ -40,14 +113,74 @@ class AbstractWordEmbeddingsDataset(Dataset, metaclass=ABCMeta):
         pass
 
     def is_encodable(self, entity: str) -> bool:
-        vec_e = self.encode(entity)
-        return vec_e is not None
+        if entity in self.vocab:
+            return True
+        return self._is_encodable_phrase(entity)
+
+    def _is_encodable_phrase(self, entity: str) -> bool:
+        is_encodable = self._encodable_phrase_cache.get(entity, None)
+        if is_encodable is None:
+            is_encodable = self.encode(entity) is not None
+            if len(self._encodable_phrase_cache) < self._ENCODABLE_PHRASE_CACHE_SIZE:
+                self._encodable_phrase_cache[entity] = is_encodable
+        return is_encodable
+
+    def get_embeddings(self, list_entities: Collection[str]) -> np.ndarray:
+        """
+        encodes the list of entities at once.
+
+        :param list_entities: list of entities. each entity must be encodable.
+        :return: embeddings matrix; (len(list_entities), n_dim)
+        """
+        if self.matrix_cache is not None:
+            return self._gather_embeddings(list_entities, self.matrix_cache)
+
+        mat_embeddings = np.empty((len(list_entities), self.n_dim), dtype=np.float32)
+        for idx, entity in enumerate(list_entities):
+            mat_embeddings[idx] = self.embedding_for(entity)
+        return mat_embeddings
+
+    def embedding_for(self, entity: str) -> np.ndarray:
+        """
+        encodes single entity. unlike `__getitem__`, it returns the embedding only and doesn't apply the transform.
+
+        :param entity: entity. it must be encodable.
+        """
+        if self.matrix_cache is not None:
+            idx = self._entity_to_idx.get(entity, -1)
+            if idx >= 0:
+                return np.array(self.matrix_cache[idx])
+        embedding = self.encode(entity)
+        assert embedding is not None, f"string `{entity}` cannot be encoded."
+        return embedding
+
+    def get_embeddings_tensor(self, list_entities: Collection[str], out: Optional[torch.Tensor] = None) -> torch.Tensor:
+        """
+        tensor version of `get_embeddings` method. if `out` is specified, embeddings are written into it.
+        embeddings are always float32 like the matrix cache, regardless of the dtype of the model.
+
+        :param list_entities: list of entities. each entity must be encodable.
+        :param out: (len(list_entities), n_dim) float32 tensor. DEFAULT: newly allocated.
+        :return: embeddings matrix; (len(list_entities), n_dim) float32 tensor
+        """
+        if not torch.is_tensor(self._shared_matrix):
+            t_embeddings = torch.from_numpy(np.asarray(self.get_embeddings(list_entities), dtype=np.float32))
+            return t_embeddings if out is None else out.copy_(t_embeddings)
+
+        # gather from the shared matrix directly, then fill the remaining (=phrases) one by one.
+        indices = self._entities_to_indices(list_entities)
+        t_embeddings = torch.index_select(self._shared_matrix, 0, torch.from_numpy(np.maximum(indices, 0)), out=out)
+        for idx in np.flatnonzero(indices < 0):
+            embedding = self.encode(list_entities[idx])
+            assert embedding is not None, f"string `{list_entities[idx]}` cannot be encoded."
+            t_embeddings[idx] = torch.from_numpy(np.asarray(embedding))
+        return t_embeddings
 
     def index_to_entity(self, index: int):
-        return self._idx_to_word[index]
+        return self._idx_to_entity_array[index]
 
-    def indices_to_entities(self, indices: Iterable[int]):
-        return [self._idx_to_word[index] for index in indices]
+    def indices_to_entities(self, indices: Iterable[int]) -> np.ndarray:
+        return self._idx_to_entity_array.take(np.asarray(indices, dtype=np.int64))
 
     @abstractmethod
     def vocab(self) -> Collection[str]:
@@ -72,8 +205,10 @@ class AbstractWordEmbeddingsDataset(Dataset, metaclass=ABCMeta):
         else:
             raise NotImplementedError(f"unsupprted key type: {type(key)}")
 
-        embedding = self.encode(word)
-        assert embedding is not None, f"string `{word}` cannot be encoded."
+        if isinstance(key, int) and (self.matrix_cache is not None):
+            embedding = np.array(self.matrix_cache[key])
+        else:
+            embedding = self.embedding_for(word)
 
         sample = {"entity":word, "embedding":embedding}
         if isinstance(self._entity_info, dict):
@@ -93,14 +228,18 @@ class GeneralPurposeEmbeddingsDataset(AbstractWordEmbeddingsDataset):
     def __init__(self, path_numpy_array_binary_format: str, path_vocabulary_text: str,
                  path_vocabulary_information_json: Optional[str] = None,
                  dict_vocabulary_information: Optional[Dict[str, Any]] = None,
-                 enable_phrase_composition:bool = False, transform=None):
+                 enable_phrase_composition:bool = False, transform=None,
+                 path_matrix_cache: Optional[str] = None):
 
         self.embedding = np.load(path_numpy_array_binary_format)
+        self._source_paths = (path_numpy_array_binary_format, path_vocabulary_text)
         sample_size = self.embedding.shape[0]
         self._vocabulary = self._load_vocabulary_text(path_vocabulary_text)
         assert len(self._vocabulary) == sample_size, "embeddings and vocabulary size mismatch detected."
         self._idx_to_word = {idx:word for idx, word in enumerate(self._vocabulary)}
         self._entity_to_idx = {word:idx for idx, word in enumerate(self._vocabulary)}
+        self._init_entity_array()
+        self._init_encodable_phrase_cache()
         self.transform = transform
         self._enable_phrase_composition = enable_phrase_composition
         if enable_phrase_composition:
@@ -115,6 +254,9 @@ class GeneralPurposeEmbeddingsDataset(AbstractWordEmbeddingsDataset):
             self._entity_info = None
         self._assert_vocabulary_information()
 
+        if path_matrix_cache is not None:
+            self.build_matrix_cache(path_matrix_cache)
+
     def _load_vocabulary_text(self, path_vocabulary_text: str):
         lst_v = []
         with io.open(path_vocabulary_text, mode="r") as ifs:
@@ -151,6 +293,10 @@ class GeneralPurposeEmbeddingsDataset(AbstractWordEmbeddingsDataset):
         vec_r = np.mean(np.stack([self.embedding[self._entity_to_idx[token],:] for token in lst_tokens]), axis=0)
         return vec_r
 
+    def get_embeddings(self, list_entities: Collection[str]) -> np.ndarray:
+        matrix = self.embedding if self.matrix_cache is None else self.matrix_cache
+        return self._gather_embeddings(list_entities, matrix)
+
     @property
     def n_dim(self):
         return self.embedding.shape[1]
@@ -163,25 +309,42 @@ class GeneralPurposeEmbeddingsDataset(AbstractWordEmbeddingsDataset):
 class FastTextDataset(AbstractWordEmbeddingsDataset):
 
     def __init__(self, path_fasttext_binary_format: str, transform=None,
-                 enable_phrase_composition=True, norm: bool = True):
+                 enable_phrase_composition=True, norm: bool = True,
+                 path_matrix_cache: Optional[str] = None):
 
         assert os.path.exists(path_fasttext_binary_format), f"file not found: {path_fasttext_binary_format}"
         self.model = fasttext.load_model(path_fasttext_binary_format)
         self.transform = transform
         self._norm = norm
+        self._source_paths = (path_fasttext_binary_format,)
+        self._source_options = {"norm":norm}
         self._enable_phrase_composition = enable_phrase_composition
         self._idx_to_word = {idx:word for idx, word in enumerate(self.model.get_words(on_unicode_error="ignore"))}
         self._vocab = set(self._idx_to_word.values())
+        self._entity_to_idx = {word:idx for idx, word in self._idx_to_word.items()}
+        self._init_entity_array()
+        self._init_encodable_phrase_cache()
+        self._input_matrix = None
 
         if enable_phrase_composition:
             self._init_mwe_tokenizer()
 
+        if path_matrix_cache is not None:
+            self.build_matrix_cache(path_matrix_cache)
+
     def _get_word_vector(self, entity: str):
         vec = self.model.get_word_vector(entity)
         if self._norm:
             vec = vec / np.linalg.norm(vec)
         return vec
 
+    @property
+    def input_matrix(self):
+        # word and subword vectors. it is copied from fastText model only once.
+        if self._input_matrix is None:
+            self._input_matrix = self.model.get_input_matrix()
+        return self._input_matrix
+
     def encode_phrase(self, phrase: str):
         lst_tokens = self.phrase_splitter(phrase)
         vec_r = np.mean(np.stack([self.model.get_word_vector(token) for token in lst_tokens]), axis=0)
@@ -198,6 +361,39 @@ class FastTextDataset(AbstractWordEmbeddingsDataset):
             else:
                 return self._get_word_vector(entity)
 
+    def get_embeddings(self, list_entities: Collection[str]) -> np.ndarray:
+        # word vector is the average of the word and its subword vectors: collect subword ids of all entities,
+        # then average them with a single gather and segmented sum.
+        if self.matrix_cache is not None:
+            return self._gather_embeddings(list_entities, self.matrix_cache)
+
+        mat_embeddings = np.empty((len(list_entities), self.n_dim), dtype=np.float32)
+        lst_subword_ids, lst_idx_words, lst_idx_others = [], [], []
+        for idx, entity in enumerate(list_entities):
+            subword_ids = None
+            if (entity in self.vocab) or (not self._enable_phrase_composition):
+                subword_ids = self.model.get_subwords(entity)[1]
+            if (subword_ids is None) or (len(subword_ids) == 0):
+                lst_idx_others.append(idx)
+            else:
+                lst_subword_ids.append(subword_ids)
+                lst_idx_words.append(idx)
+
+        if len(lst_idx_words) > 0:
+            n_subwords = np.array(list(map(len, lst_subword_ids)), dtype=np.int64)
+            offsets = np.concatenate(([0], np.cumsum(n_subwords)[:-1]))
+            mat_subwords = self.input_matrix.take(np.concatenate(lst_subword_ids), axis=0)
+            mat_vectors = np.add.reduceat(mat_subwords, offsets, axis=0) / n_subwords[:,np.newaxis]
+            if self._norm:
+                mat_vectors /= np.linalg.norm(mat_vectors, axis=-1, keepdims=True)
+            mat_embeddings[lst_idx_words] = mat_vectors
+
+        # phrases are composed one by one.
+        for idx in lst_idx_others:
+            mat_embeddings[idx] = self.encode(list_entities[idx])
+
+        return mat_embeddings
+
     # fastText embedding can encode arbitrary string.
     def is_encodable(self, entity: str) -> bool:
         return True
@@ -214,7 +410,7 @@ class FastTextDataset(AbstractWordEmbeddingsDataset):
 class Word2VecDataset(AbstractWordEmbeddingsDataset):
 
     def __init__(self, path_word2vec_format: str, binary: bool = True, init_sims: bool = False, transform=None,
-                 enable_phrase_composition=True, **kwargs):
+                 enable_phrase_composition=True, path_matrix_cache: Optional[str] = None, **kwargs):
 
         assert os.path.exists(path_word2vec_format), f"file not found: {path_word2vec_format}"
         if "mmap" in kwargs:
@@ -224,13 +420,21 @@ class Word2VecDataset(AbstractWordEmbeddingsDataset):
             self.model = KeyedVectors.load_word2vec_format(path_word2vec_format, binary=binary, **kwargs)
         if init_sims:
             self.model.init_sims(replace=True)
+        self._source_paths = (path_word2vec_format,)
+        self._source_options = {"binary":binary, "init_sims":init_sims, **kwargs}
         self._idx_to_word = self.model.index2word
+        self._entity_to_idx = {word:idx for idx, word in enumerate(self._idx_to_word)}
+        self._init_entity_array()
+        self._init_encodable_phrase_cache()
         self.transform = transform
         self._enable_phrase_composition = enable_phrase_composition
 
         if enable_phrase_composition:
             self._init_mwe_tokenizer()
 
+        if path_matrix_cache is not None:
+            self.build_matrix_cache(path_matrix_cache)
+
     def encode_phrase(self, phrase: str):
         lst_tokens = self.phrase_splitter(phrase)
         if not all([token in self.vocab for token in lst_tokens]):
@@ -247,6 +451,10 @@ class Word2VecDataset(AbstractWordEmbeddingsDataset):
             else:
                 return None
 
+    def get_embeddings(self, list_entities: Collection[str]) -> np.ndarray:
+        matrix = self.model.vectors if self.matrix_cache is None else self.matrix_cache
+        return self._gather_embeddings(list_entities, matrix)
+
     @property
     def n_dim(self):
         return self.model.vector_size
@@ -1,3 +1,3 @@
 #!/bin/sh
 
-python -m unittest tests_inner.test_loss_layer tests_inner.test_dataset_word_embeddings tests_inner.test_dataset_embeddings_plus_lexical_knowledge tests_inner.test_taxonomy -v
+python -m unittest tests_inner.test_loss_layer tests_inner.test_encoder tests_inner.test_triton_kernels tests_inner.test_dataset_filter tests_inner.test_dataset_word_embeddings tests_inner.test_dataset_embeddings_plus_lexical_knowledge tests_inner.test_taxonomy -v
@@ -261,6 +261,11 @@ class SupervisedTrainer(UnsupervisedTrainer):
         self._scale_loss_non_hyponymy = loss_non_hyponymy.scale if loss_non_hyponymy is not None else 1.
         self._scale_loss_code_length = loss_code_length.scale if loss_code_length is not None else 1.
 
+    def _get_relation(self, data_batch, field_name: str):
+        # relations collated into (index tensor, ..., value tensor) by the dataloader are preferred,
+        # then loss layers skip unpacking python tuples. see dataset.embeddings_plus_lexical_knowledge._collate_minibatch()
+        return data_batch.get(field_name + "_tensors", data_batch[field_name])
+
     def training_step(self, data_batch, batch_nb):
 
         current_step = self.trainer.global_step / (self.trainer.max_nb_epochs * self.trainer.total_batches)
@@ -285,20 +290,17 @@ class SupervisedTrainer(UnsupervisedTrainer):
             code_repr = t_code_prob
 
         # (required) hyponymy score loss
-        lst_tup_hyponymy = data_batch["hyponymy_relation"]
-        loss_hyponymy = self._loss_hyponymy(code_repr, lst_tup_hyponymy)
+        loss_hyponymy = self._loss_hyponymy(code_repr, self._get_relation(data_batch, "hyponymy_relation"))
 
         # (optional) non-hyponymy score loss
         if self._loss_non_hyponymy is not None:
-            lst_tup_non_hyponymy = data_batch["non_hyponymy_relation"]
-            loss_non_hyponymy = self._loss_non_hyponymy(code_repr, lst_tup_non_hyponymy)
+            loss_non_hyponymy = self._loss_non_hyponymy(code_repr, self._get_relation(data_batch, "non_hyponymy_relation"))
         else:
             loss_non_hyponymy = torch.tensor(0.0, dtype=torch.float32, device=t_code_prob.device)
 
         # (optional) code length loss
         if self._loss_code_length is not None:
-            lst_tup_entity_depth = data_batch["entity_depth"]
-            loss_code_length = self._loss_code_length(code_repr, lst_tup_entity_depth)
+            loss_code_length = self._loss_code_length(code_repr, self._get_relation(data_batch, "entity_depth"))
         else:
             loss_code_length = torch.tensor(0.0, dtype=torch.float32, device=t_code_prob.device)
 
@@ -336,19 +338,18 @@ class SupervisedTrainer(UnsupervisedTrainer):
             code_repr = t_code_prob
 
         # (required) hyponymy score loss
-        lst_tup_hyponymy = data_batch["hyponymy_relation"]
-        loss_hyponymy = self._loss_hyponymy(code_repr, lst_tup_hyponymy)
+        loss_hyponymy = self._loss_hyponymy(code_repr, self._get_relation(data_batch, "hyponymy_relation"))
 
         # (optional) non-hyponymy score loss
         if self._loss_non_hyponymy is not None:
-            lst_tup_non_hyponymy = data_batch["non_hyponymy_relation"]
-            loss_non_hyponymy = self._loss_non_hyponymy(code_repr, lst_tup_non_hyponymy)
+            loss_non_hyponymy = self._loss_non_hyponymy(code_repr, self._get_relation(data_batch, "non_hyponymy_relation"))
         else:
             loss_non_hyponymy = torch.tensor(0.0, dtype=torch.float32, device=t_code_prob.device)
             cache = self._loss_hyponymy.reduction
             self._loss_hyponymy.reduction = "none"
-            lst_loss_hyponymy = self._loss_hyponymy(code_repr, lst_tup_hyponymy)
+            lst_loss_hyponymy = self._loss_hyponymy(code_repr, self._get_relation(data_batch, "hyponymy_relation"))
             self._loss_hyponymy.reduction = cache
+            lst_tup_hyponymy = data_batch["hyponymy_relation"]
             n_sample = len(lst_tup_hyponymy)
             for l, (u, v, distance) in zip(lst_loss_hyponymy, lst_tup_hyponymy):
                 if distance < 0:
@@ -357,8 +358,7 @@ class SupervisedTrainer(UnsupervisedTrainer):
 
         # (optional) code length loss
         if self._loss_code_length is not None:
-            lst_tup_entity_depth = data_batch["entity_depth"]
-            loss_code_length = self._loss_code_length(code_repr, lst_tup_entity_depth)
+            loss_code_length = self._loss_code_length(code_repr, self._get_relation(data_batch, "entity_depth"))
         else:
             loss_code_length = torch.tensor(0.0, dtype=torch.float32, device=t_code_prob.device)
 
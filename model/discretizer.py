@@ -134,14 +134,11 @@ class MaskedGumbelSoftmax(GumbelSoftmax):
 
     def forward(self, probs, dim: int = -1):
 
-        dtype, device = self._dtype_and_device(probs)
-        n_ary = probs.shape[-1]
-
         # split p(C_n=0|x) and p(C_n!=0|x)
         # t_p_c_zero: (n_batch, n_digits, 1)
-        probs_zero = torch.index_select(probs, dim=-1, index=torch.tensor(0, device=device))
+        probs_zero = probs[...,:1]
         # t_p_c_nonzero: (n_batch, n_digits, n_ary-1)
-        probs_nonzero = torch.index_select(probs, dim=-1, index=torch.arange(1, n_ary, dtype=torch.long, device=device))
+        probs_nonzero = probs[...,1:]
 
         # apply gumbel-softmax trick only on nonzero probabilities
         gumbels_nonzero = super().forward(probs_nonzero, dim=-1)
@@ -208,9 +205,9 @@ class ScheduledGumbelSoftmax(GumbelSoftmax):
 
         # split p(C_n=0|x) and p(C_n!=0|x)
         # t_p_c_zero: (n_batch, n_digits, 1)
-        probs_gs_zero = torch.index_select(probs_gs, dim=-1, index=torch.tensor(0, device=device))
+        probs_gs_zero = probs_gs[...,:1]
         # t_p_c_nonzero: (n_batch, n_digits, n_ary-1)
-        probs_gs_nonzero = torch.index_select(probs_gs, dim=-1, index=torch.arange(1, n_ary, dtype=torch.long, device=device))
+        probs_gs_nonzero = probs_gs[...,1:]
 
         # compute gate mask
         # gate_mask: (1,n_digits,1)
@@ -8,6 +8,7 @@ from __future__ import print_function
 import warnings
 from typing import List, Optional
 import inspect
+from contextlib import nullcontext
 import torch
 from torch import nn
 from torch.nn import functional as F
@@ -20,7 +21,12 @@ class SimpleEncoder(nn.Module):
 
     def __init__(self, n_dim_emb: int, n_digits: int, n_ary: int,
                  n_dim_hidden: Optional[int] = None,
-                 dtype=torch.float32, **kwargs):
+                 dtype=torch.float32,
+                 autocast_dtype: Optional[torch.dtype] = None, **kwargs):
+        """
+        :param autocast_dtype: if specified (e.g. torch.bfloat16), linear layers run under autocast with this dtype.
+            code probability is always normalized in float32.
+        """
 
         super(SimpleEncoder, self).__init__()
 
@@ -29,21 +35,43 @@ class SimpleEncoder(nn.Module):
         self._n_digits = n_digits
         self._n_ary = n_ary
         self._dtype = dtype
+        self._autocast_dtype = autocast_dtype
 
         self._build()
 
     def _build(self):
 
         self.x_to_h = nn.Linear(in_features=self._n_dim_emb, out_features=self._n_dim_hidden)
-        self.lst_h_to_z = nn.ModuleList([nn.Linear(in_features=self._n_dim_hidden, out_features=self._n_ary) for n in range(self._n_digits)])
+        # h -> z_n for all digits at once: single (n_dim_hidden, n_digits*n_ary) linear layer.
+        self.h_to_z = nn.Linear(in_features=self._n_dim_hidden, out_features=self._n_digits*self._n_ary)
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        # convert the parameters of the per-digit linear layers (`lst_h_to_z.{n}.*`) into the fused linear layer.
+        if isinstance(getattr(self, "h_to_z", None), nn.Linear) and f"{prefix}h_to_z.weight" not in state_dict:
+            for param_name in ("weight", "bias"):
+                lst_keys = [f"{prefix}lst_h_to_z.{n}.{param_name}" for n in range(self._n_digits)]
+                if all([key in state_dict for key in lst_keys]):
+                    state_dict[f"{prefix}h_to_z.{param_name}"] = torch.cat([state_dict.pop(key) for key in lst_keys], dim=0)
+        super(SimpleEncoder, self)._load_from_state_dict(state_dict, prefix, *args, **kwargs)
 
     def forward(self, input_x: torch.Tensor):
 
-        t_h = torch.tanh(self.x_to_h(input_x))
-        lst_z = [torch.log(F.softplus(h_to_z(t_h))) for h_to_z in self.lst_h_to_z]
-        lst_prob_c = [F.softmax(t_z, dim=1) for t_z in lst_z]
-
-        t_prob_c = torch.stack(lst_prob_c, dim=1)
+        # autocast context is entered only when it is enabled.
+        if self._autocast_dtype is None:
+            context = nullcontext()
+        else:
+            context = torch.autocast(device_type=input_x.device.type, dtype=self._autocast_dtype)
+        with context:
+            t_h = torch.tanh(self.x_to_h(input_x))
+            # t_z: (n_batch, n_digits, n_ary)
+            t_z = self.h_to_z(t_h).view(*t_h.shape[:-1], self._n_digits, self._n_ary)
+        if self._autocast_dtype is not None:
+            t_z = t_z.float()
+
+        # t_prob_c: (n_batch, n_digits, n_ary)
+        # softmax(log(softplus(z))) = softplus(z) / \sum_{m}softplus(z_m). it avoids redundant log and exp.
+        t_z = F.softplus(t_z)
+        t_prob_c = t_z / t_z.sum(dim=-1, keepdim=True)
 
         return t_prob_c
 
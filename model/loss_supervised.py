@@ -1,26 +1,211 @@
 #!/usr/bin/env python
 # -*- coding:utf-8 -*-
-from typing import List, Tuple
+from typing import List, Tuple, Optional, Union
 
+import numpy as np
 import torch
 from torch import nn
 from torch.nn import functional as F
 from torch.nn.modules import loss as L
 
+from . import triton_kernels
+
+
+def _intensity_to_probability(t_intensity: torch.Tensor) -> torch.Tensor:
+    # t_intensity can be either one or two dimensional tensor.
+    # t_prob[n] = \prod_{d<n}(1-t_intensity[d]) * t_intensity[n] where t_intensity[n_digits] = 1.
+    t_prob = torch.cumprod(F.pad(1.0 - t_intensity, (1,0), value=1.0), dim=-1) * F.pad(t_intensity, (0,1), value=1.0)
+    return t_prob
+
+
+def _soft_code_length(t_prob_c: torch.Tensor, t_at_n: Optional[torch.Tensor] = None) -> torch.Tensor:
+    # t_p_c_zero: (n_batch, n_digits)
+    t_p_c_zero = t_prob_c[...,0]
+    n_digits = t_p_c_zero.shape[-1]
+
+    t_p_at_n = _intensity_to_probability(t_p_c_zero)
+    # t_at_n: [0,1,...,n_digits]
+    if t_at_n is None:
+        t_at_n = torch.arange(n_digits+1, dtype=t_prob_c.dtype, device=t_prob_c.device)
+
+    return torch.sum(t_p_at_n * t_at_n, dim=-1)
+
+
+def _soft_code_length_pair(t_prob_c_x: torch.Tensor, t_prob_c_y: torch.Tensor, t_at_n: Optional[torch.Tensor] = None) -> Tuple[torch.Tensor, torch.Tensor]:
+    # computes code length of both x and y at once by stacking the probability of zero.
+    # t_p_c_zero: (2, n_batch, n_digits)
+    t_p_c_zero = torch.stack((t_prob_c_x[...,0], t_prob_c_y[...,0]))
+    n_digits = t_p_c_zero.shape[-1]
+
+    t_p_at_n = _intensity_to_probability(t_p_c_zero)
+    if t_at_n is None:
+        t_at_n = torch.arange(n_digits+1, dtype=t_prob_c_x.dtype, device=t_prob_c_x.device)
+
+    t_code_length = torch.sum(t_p_at_n * t_at_n, dim=-1)
+    return t_code_length[0], t_code_length[1]
+
+
+def _gamma_hat(t_prob_c_x: torch.Tensor, t_prob_c_y: torch.Tensor) -> torch.Tensor:
+    # probability that both x and y take the same nonzero value at each digit.
+    # t_gamma_hat: (n_batch, n_digits)
+    return torch.sum(t_prob_c_x * t_prob_c_y, dim=-1) - t_prob_c_x[...,0] * t_prob_c_y[...,0]
+
+
+def _break_intensity_from_gamma(t_gamma_hat: torch.Tensor) -> torch.Tensor:
+    return 1.0 - t_gamma_hat
+
+
+def _ancestor_probability_from_gamma(t_gamma_hat: torch.Tensor, t_p_c_x_zero: torch.Tensor, t_p_c_y_zero: torch.Tensor) -> torch.Tensor:
+    # t_beta: (n_batch, n_digits)
+    t_beta = t_p_c_x_zero*(1.- t_p_c_y_zero)
+    # shift right by one digit and prepend 1.0 at the beginning
+    # t_gamma: (n_batch, n_digits)
+    t_gamma = F.pad(t_gamma_hat[...,:-1], (1,0), value=1.0)
+    # t_prob: (n_batch,)
+    return torch.sum(t_beta*torch.cumprod(t_gamma, dim=-1), dim=-1)
+
+
+def _soft_lowest_common_ancestor_length_from_gamma(t_gamma_hat: torch.Tensor, t_at_n: Optional[torch.Tensor] = None) -> torch.Tensor:
+    n_digits = t_gamma_hat.shape[-1]
+
+    t_prob_break = _intensity_to_probability(_break_intensity_from_gamma(t_gamma_hat))
+
+    if t_at_n is None:
+        t_at_n = torch.arange(n_digits+1, dtype=t_gamma_hat.dtype, device=t_gamma_hat.device)
+    return torch.sum(t_prob_break * t_at_n, dim=-1)
+
+
+def _break_intensity(t_prob_c_x: torch.Tensor, t_prob_c_y: torch.Tensor) -> torch.Tensor:
+    # x: hypernym, y: hyponym
+    return _break_intensity_from_gamma(_gamma_hat(t_prob_c_x, t_prob_c_y))
+
+
+def _ancestor_probability(t_prob_c_x: torch.Tensor, t_prob_c_y: torch.Tensor) -> torch.Tensor:
+    return _ancestor_probability_from_gamma(_gamma_hat(t_prob_c_x, t_prob_c_y), t_prob_c_x[...,0], t_prob_c_y[...,0])
+
+
+def _soft_lowest_common_ancestor_length(t_prob_c_x: torch.Tensor, t_prob_c_y: torch.Tensor, t_at_n: Optional[torch.Tensor] = None) -> torch.Tensor:
+    return _soft_lowest_common_ancestor_length_from_gamma(_gamma_hat(t_prob_c_x, t_prob_c_y), t_at_n)
+
+
+def _soft_hyponymy_score(t_prob_c_x: torch.Tensor, t_prob_c_y: torch.Tensor, t_at_n: Optional[torch.Tensor] = None) -> torch.Tensor:
+    # x: hypernym, y: hyponym
+    # t_prob_c_*[b,n,v] = Pr{C_n=v|x_b}; t_prob_c_*: (n_batch, n_digits, n_ary)
+
+    # l_hyper, l_hypo = hypernym / hyponym code length
+    l_hyper, l_hypo = _soft_code_length_pair(t_prob_c_x, t_prob_c_y, t_at_n)
+    return _soft_hyponymy_score_from_code_length(l_hyper, l_hypo, t_prob_c_x, t_prob_c_y, t_at_n)
+
+
+def _soft_hyponymy_score_from_code_length(l_hyper: torch.Tensor, l_hypo: torch.Tensor,
+                                          t_prob_c_x: torch.Tensor, t_prob_c_y: torch.Tensor, t_at_n: Optional[torch.Tensor] = None) -> torch.Tensor:
+    # gamma_hat is shared by the ancestor probability and the length of the lowest common ancestor.
+    t_gamma_hat = _gamma_hat(t_prob_c_x, t_prob_c_y)
+    # alpha = probability of hyponymy relation
+    alpha = _ancestor_probability_from_gamma(t_gamma_hat, t_prob_c_x[...,0], t_prob_c_y[...,0])
+    # l_lca = length of the lowest common ancestor
+    l_lca = _soft_lowest_common_ancestor_length_from_gamma(t_gamma_hat, t_at_n)
+
+    return alpha * (l_hypo - l_hyper) + (1. - alpha) * (l_lca - l_hyper)
+
+
+def _no_reduction(t: torch.Tensor) -> torch.Tensor:
+    return t
+
+
+# reduction functions for the distances which are computed by hand.
+_reduction_functions = {"mean": torch.mean, "sum": torch.sum, "none": _no_reduction}
+
+
+# distance functions that can be compiled by torch.jit.script(). reduction is passed explicitly.
+
+def _scale_dynamic_pair(u: torch.Tensor, v: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+    # scales u and v with single reduction by stacking them.
+    t_uv = torch.stack([u, v])
+    t_uv = t_uv / (t_uv.std(dim=-1, keepdim=True) + 1E-6)
+    return t_uv[0], t_uv[1]
+
+
+def _standardize_pair(u: torch.Tensor, v: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+    # standardizes u and v with single reduction by stacking them.
+    t_uv = torch.stack([u, v])
+    t_uv = (t_uv - t_uv.mean(dim=-1, keepdim=True)) / (t_uv.std(dim=-1, keepdim=True) + 1E-6)
+    return t_uv[0], t_uv[1]
+
+
+def _mse_distance(u: torch.Tensor, v: torch.Tensor, reduction: str) -> torch.Tensor:
+    return F.mse_loss(u, v, reduction=reduction)
+
+
+def _scaled_mse_distance(u: torch.Tensor, v: torch.Tensor, reduction: str) -> torch.Tensor:
+    u_s, v_s = _scale_dynamic_pair(u, v)
+    return F.mse_loss(u_s, v_s, reduction=reduction)
+
+
+def _standardized_mse_distance(u: torch.Tensor, v: torch.Tensor, reduction: str) -> torch.Tensor:
+    u_s, v_s = _standardize_pair(u, v)
+    return F.mse_loss(u_s, v_s, reduction=reduction)
+
+
+def _mae_distance(u: torch.Tensor, v: torch.Tensor, reduction: str) -> torch.Tensor:
+    return F.l1_loss(u, v, reduction=reduction)
+
+
+def _scaled_mae_distance(u: torch.Tensor, v: torch.Tensor, reduction: str) -> torch.Tensor:
+    u_s, v_s = _scale_dynamic_pair(u, v)
+    return F.l1_loss(u_s, v_s, reduction=reduction)
+
+
+_scriptable_distance_functions = {
+    "mse": _mse_distance,
+    "scaled-mse": _scaled_mse_distance,
+    "standardized-mse": _standardized_mse_distance,
+    "mae": _mae_distance,
+    "scaled-mae": _scaled_mae_distance
+}
+# scripted distance functions shared by all instances. key: distance metric
+_scripted_distance_functions = {}
+
+
+def _get_scripted_distance_function(distance_metric: str):
+    if distance_metric not in _scripted_distance_functions:
+        _scripted_distance_functions[distance_metric] = torch.jit.script(_scriptable_distance_functions[distance_metric])
+    return _scripted_distance_functions[distance_metric]
+
 
 class CodeLengthPredictionLoss(L._Loss):
 
     def __init__(self, scale: float = 1.0, normalize_code_length: bool = False, normalize_coefficient_for_ground_truth: float = 1.0,
                  distance_metric: str = "scaled-mse",
+                 compile_forward: bool = False, use_bf16: bool = False, use_triton: bool = False,
+                 use_torch_script: bool = False,
                  size_average=None, reduce=None, reduction='mean'):
+        """
+        :param compile_forward: compile the tensor part of the forward computation using torch.compile(mode="reduce-overhead"). it requires PyTorch 2.0 or later.
+        :param use_bf16: compute the predicted value from float32 code probabilities in bfloat16. distance is computed in float32.
+        it is ignored when autocast is enabled.
+        :param use_triton: compute the soft code length and the ancestor probability using the fused triton kernels. it is used for CUDA tensors only.
+        :param use_torch_script: compile the distance function using torch.jit.script().
+        available distance metrics are: mse, scaled-mse, standardized-mse, mae, and scaled-mae.
+        """
 
         super(CodeLengthPredictionLoss, self).__init__(size_average, reduce, reduction)
 
+        if compile_forward and not hasattr(torch, "compile"):
+            raise NotImplementedError(f"torch.compile() is not available on PyTorch {torch.__version__}.")
+        self._compile_forward = compile_forward
+        self._compiled_forward_impl = None
+        self._use_bf16 = use_bf16
+        if use_triton and not triton_kernels.is_available():
+            raise NotImplementedError("triton is not installed.")
+        self._use_triton = use_triton
+
         self._scale = scale
         self._normalize_code_length = normalize_code_length
         self._normalize_coef_for_gt = normalize_coefficient_for_ground_truth
 
         self._distance_metric = distance_metric
+        self._arange_cache = {}
         if distance_metric == "mse":
             self._func_distance = self._mse
         elif distance_metric == "scaled-mse":
@@ -33,7 +218,6 @@ class CodeLengthPredictionLoss(L._Loss):
             self._func_distance = self._positive_auto_scaled_mse
         elif distance_metric == "batchnorm-mse":
             self._func_distance = self._batchnorm_mse
-            self._m = nn.BatchNorm1d(1)
         elif distance_metric == "mae":
             self._func_distance = self._mae
         elif distance_metric == "scaled-mae":
@@ -47,9 +231,106 @@ class CodeLengthPredictionLoss(L._Loss):
         else:
             raise AttributeError(f"unsupported distance metric was specified: {distance_metric}")
 
+        if self.reduction not in _reduction_functions:
+            raise NotImplementedError(f"unsupported reduction method was specified: {self.reduction}")
+
+        if use_torch_script:
+            if distance_metric not in _scriptable_distance_functions:
+                raise NotImplementedError(f"torch.jit.script() is not supported for the distance metric: {distance_metric}")
+            func_scripted = _get_scripted_distance_function(distance_metric)
+            self._func_distance = lambda u, v: func_scripted(u, v, self.reduction)
+
     def _dtype_and_device(self, t: torch.Tensor):
         return t.dtype, t.device
 
+    def _is_autocast_enabled(self, device) -> bool:
+        try:
+            return torch.is_autocast_enabled(device.type)
+        except TypeError:
+            # PyTorch < 2.4 doesn't accept device type.
+            return torch.is_autocast_cpu_enabled() if device.type == "cpu" else torch.is_autocast_enabled()
+
+    def _to_compute_dtype(self, t: torch.Tensor) -> torch.Tensor:
+        # casts code probabilities to bfloat16. autocast takes care of the precision by itself.
+        if self._use_bf16 and (t.dtype == torch.float32) and not self._is_autocast_enabled(t.device):
+            return t.to(torch.bfloat16)
+        return t
+
+    def _call_forward_impl(self, *tensors: torch.Tensor) -> torch.Tensor:
+        # tuple unpacking is done by the caller so that compiled region receives tensors only.
+        if not self._compile_forward:
+            return self._forward_impl(*tensors)
+        if self._compiled_forward_impl is None:
+            # batch size varies whereas (n_digits, n_ary) doesn't.
+            self._compiled_forward_impl = torch.compile(self._forward_impl, mode="reduce-overhead", dynamic=True)
+        return self._compiled_forward_impl(*tensors)
+
+    def _index_select_pair(self, t: torch.Tensor, t_idx_x: torch.Tensor, t_idx_y: torch.Tensor,
+                           clamp_range: Optional[Tuple[float, float]] = None) -> Tuple[torch.Tensor, torch.Tensor]:
+        # gathers rows for both x and y at once, then splits them as views.
+        # clamp_range: (min, max). gathered rows are clamped in-place, so that whole batch won't be copied.
+        n_x = t_idx_x.shape[0]
+        t_gathered = torch.index_select(t, dim=0, index=torch.cat((t_idx_x, t_idx_y)))
+        if clamp_range is not None:
+            t_gathered = t_gathered.clamp_(*clamp_range)
+        return t_gathered[:n_x], t_gathered[n_x:]
+
+    def _get_arange(self, n: int, dtype, device) -> torch.Tensor:
+        # [0,1,...,n-1] is reused across iterations.
+        key = (n, dtype, device)
+        t_arange = self._arange_cache.get(key, None)
+        if t_arange is None:
+            t_arange = torch.arange(n, dtype=dtype, device=device)
+            self._arange_cache[key] = t_arange
+        return t_arange
+
+    def _get_digit_positions(self, t_prob_c: torch.Tensor) -> torch.Tensor:
+        # [0,1,...,n_digits]
+        n_digits = t_prob_c.shape[-2]
+        return self._get_arange(n_digits+1, dtype=t_prob_c.dtype, device=t_prob_c.device)
+
+    @staticmethod
+    def collate_tuples(lst_tuples, n_index_columns: int) -> Tuple[torch.Tensor, ...]:
+        """
+        converts the list of (index, ..., value) tuples into (index tensor)*n_index_columns + (value tensor,) on cpu.
+        it is intended to be called in the collate_fn of the dataloader, so that forward() doesn't have to unpack the tuples.
+
+        :param lst_tuples: list of tuples or (n, n_index_columns+1) array.
+        :param n_index_columns: number of index columns.
+        """
+        arry_tuples = np.asarray(lst_tuples, dtype=np.float64).reshape(-1, n_index_columns+1)
+        lst_t_idx = [torch.from_numpy(arry_tuples[:,col].astype(np.int64)) for col in range(n_index_columns)]
+        t_values = torch.from_numpy(arry_tuples[:,-1].astype(np.float32))
+        return (*lst_t_idx, t_values)
+
+    @staticmethod
+    def collate_code_length_tuples(lst_code_length_tuple) -> Tuple[torch.Tensor, torch.Tensor]:
+        # (entity index, entity depth) -> (index tensor, depth tensor)
+        return CodeLengthPredictionLoss.collate_tuples(lst_code_length_tuple, n_index_columns=1)
+
+    def _unpack_tuples(self, lst_tuples, n_index_columns: int, dtype, device) -> Tuple[torch.Tensor, ...]:
+        """
+        converts the list of (index, ..., value) tuples into index tensors and value tensor with single host-to-device copy.
+
+        :param lst_tuples: list of tuples, (n, n_index_columns+1) array, or tensors returned by collate_tuples().
+        :param n_index_columns: number of index columns.
+        :return: (index tensor)*n_index_columns + (value tensor,)
+        """
+        if isinstance(lst_tuples, tuple) and (len(lst_tuples) == n_index_columns+1) and all(map(torch.is_tensor, lst_tuples)):
+            # already collated. copy values so that in-place operations on returned tensors won't modify the input.
+            lst_t_idx = [t_idx.to(device, non_blocking=True) for t_idx in lst_tuples[:-1]]
+            t_values = lst_tuples[-1].to(device=device, dtype=dtype, non_blocking=True, copy=True)
+            return (*lst_t_idx, t_values)
+
+        # copy so that in-place operations on returned tensors won't modify the input.
+        arry_tuples = np.array(lst_tuples, dtype=np.float64).reshape(-1, n_index_columns+1)
+        t_tuples = torch.from_numpy(arry_tuples)
+        if device.type == "cuda":
+            t_tuples = t_tuples.pin_memory().to(device, non_blocking=True)
+        lst_t_idx = [t_tuples[:,col].long() for col in range(n_index_columns)]
+        t_values = t_tuples[:,-1].to(dtype)
+        return (*lst_t_idx, t_values)
+
     @property
     def scale(self):
         return self._scale
@@ -67,19 +348,36 @@ class CodeLengthPredictionLoss(L._Loss):
         stds = vec.std(dim=dim, keepdim=True)
         return vec / (stds + 1E-6)
 
+    def _standardize_pair(self, u: torch.Tensor, v: torch.Tensor):
+        return _standardize_pair(u, v)
+
+    def _scale_dynamic_pair(self, u: torch.Tensor, v: torch.Tensor):
+        return _scale_dynamic_pair(u, v)
+
     def _mse(self, u, v) -> torch.Tensor:
-        return F.mse_loss(u, v, reduction=self.reduction)
+        return _mse_distance(u, v, self.reduction)
 
     def _scaled_mse(self, u, v) -> torch.Tensor:
-        return F.mse_loss(self._scale_dynamic(u), self._scale_dynamic(v), reduction=self.reduction)
+        return _scaled_mse_distance(u, v, self.reduction)
 
     def _standardized_mse(self, u, v) -> torch.Tensor:
-        return F.mse_loss(self._standardize(u), self._standardize(v), reduction=self.reduction)
+        return _standardized_mse_distance(u, v, self.reduction)
+
+    def _optimal_scale(self, u, v) -> torch.Tensor:
+        # least-squares scale that minimizes |scale*u - v|^2. it is treated as a constant.
+        # it is kept as 0-dim tensor so that no device-to-host synchronization occurs.
+        with torch.no_grad():
+            u_flat, v_flat = u.reshape(-1), v.reshape(-1)
+            scale = torch.dot(u_flat, v_flat) / (torch.dot(u_flat, u_flat) + 1E-6)
+        return scale
 
     def _auto_scaled_mse(self, u, v) -> torch.Tensor:
         # assume u and y is predicted and ground-truth values, respectively.
-        scale = torch.sum(u.detach()*v.detach()) / (torch.sum(u.detach()**2)+1E-6)
-        if scale > 0:
+        # falls back to scaled mse when the optimal scale is non-positive.
+        # fallback must be computed only when it is selected: its std is NaN for single pair, then NaN leaks into the gradient
+        # even if it is masked out by torch.where. hence single synchronization is required to branch.
+        scale = self._optimal_scale(u, v)
+        if scale.item() > 0:
             loss = F.mse_loss(scale*u, v, reduction=self.reduction)
         else:
             loss = self._scaled_mse(u, v)
@@ -87,76 +385,90 @@ class CodeLengthPredictionLoss(L._Loss):
 
     def _positive_auto_scaled_mse(self, u, v) -> torch.Tensor:
         # assume u and y is predicted and ground-truth values, respectively.
-        scale = max(1.0, torch.sum(u.detach()*v.detach()) / (torch.sum(u.detach()**2)+1E-6))
+        scale = torch.clamp(self._optimal_scale(u, v), min=1.0)
         loss = F.mse_loss(scale*u, v, reduction=self.reduction)
         return loss
 
+    def _batchnorm_mse(self, u, v, eps: float = 1E-5) -> torch.Tensor:
+        # normalizes both u and v using the mean and variance of [u;v], like the batch normalization without affine transform.
+        # it is stateless, hence no running statistics are kept.
+        t_uv = torch.cat((u, v))
+        mean, var = t_uv.mean(), t_uv.var(unbiased=False)
+        t_uv = (t_uv - mean) / torch.sqrt(var + eps)
+        n_u = u.shape[0]
+        return F.mse_loss(t_uv[:n_u], t_uv[n_u:], reduction=self.reduction)
+
     def _mae(self, u, v) -> torch.Tensor:
-        return F.l1_loss(u, v, reduction=self.reduction)
+        return _mae_distance(u, v, self.reduction)
 
     def _scaled_mae(self, u, v) -> torch.Tensor:
-        return F.l1_loss(self._scale_dynamic(u), self._scale_dynamic(v), reduction=self.reduction)
+        return _scaled_mae_distance(u, v, self.reduction)
 
     def _cosine_distance(self, u, v, dim=0, eps=1e-8) -> torch.Tensor:
         return 1.0 - F.cosine_similarity(u, v, dim, eps)
 
     def _hinge_distance(self, y_pred, y_true) -> torch.Tensor:
         hinge_loss = F.relu(y_pred - y_true)
-        if self.reduction == "mean":
-            return torch.mean(hinge_loss)
-        elif self.reduction == "sum":
-            return torch.sum(hinge_loss)
-        elif self.reduction == "none":
-            return hinge_loss
-        else:
+        # reduction is looked up on every call because it may be changed after construction.
+        func_reduce = _reduction_functions.get(self.reduction, None)
+        if func_reduce is None:
             raise NotImplementedError(f"unsupported reduction method was specified: {self.reduction}")
+        return func_reduce(hinge_loss)
 
     def _bce(self, u, v) -> torch.Tensor:
         return F.binary_cross_entropy(u, v, reduction=self.reduction)
 
     def _intensity_to_probability(self, t_intensity):
-        # t_intensity can be either one or two dimensional tensor.
-        dtype, device = self._dtype_and_device(t_intensity)
-        pad_shape = t_intensity.shape[:-1] + (1,)
-
-        t_pad_begin = torch.zeros(pad_shape, dtype=dtype, device=device)
-        t_pad_end = torch.ones(pad_shape, dtype=dtype, device=device)
-
-        t_prob = torch.cumprod(1.0 - torch.cat((t_pad_begin, t_intensity), dim=-1), dim=-1) * torch.cat((t_intensity, t_pad_end), dim=-1)
-
-        return t_prob
+        return _intensity_to_probability(t_intensity)
 
     def calc_soft_code_length(self, t_prob_c: torch.Tensor):
-        t_p_c_zero = torch.index_select(t_prob_c, dim=-1, index=torch.tensor(0, device=t_prob_c.device)).squeeze()
-        n_digits = t_p_c_zero.shape[-1]
-        dtype, device = self._dtype_and_device(t_prob_c)
-
-        t_p_at_n = self._intensity_to_probability(t_p_c_zero)
-        t_at_n = torch.arange(n_digits+1, dtype=dtype, device=device)
-
-        ret = torch.sum(t_p_at_n * t_at_n, dim=-1)
-        return ret
-
-    def forward(self, t_prob_c_batch: torch.Tensor, lst_code_length_tuple: List[Tuple[int, float]]) -> torch.Tensor:
+        if self._use_triton and t_prob_c.is_cuda:
+            return triton_kernels.soft_code_length_triton(t_prob_c[...,0])
+        return _soft_code_length(t_prob_c, self._get_digit_positions(t_prob_c))
+
+    def calc_soft_code_length_pair(self, t_prob_c_x: torch.Tensor, t_prob_c_y: torch.Tensor):
+        # code length of x and y; it is equivalent to but faster than calling calc_soft_code_length() twice.
+        if self._use_triton and t_prob_c_x.is_cuda:
+            n_batch = t_prob_c_x.shape[0]
+            # kernel processes (2*n_batch, n_digits) rows at once.
+            t_p_c_zero = torch.stack((t_prob_c_x[...,0], t_prob_c_y[...,0])).view(2*n_batch, -1)
+            t_code_length = triton_kernels.soft_code_length_triton(t_p_c_zero)
+            return t_code_length[:n_batch], t_code_length[n_batch:]
+        return _soft_code_length_pair(t_prob_c_x, t_prob_c_y, self._get_digit_positions(t_prob_c_x))
+
+    def forward(self, t_prob_c_batch: torch.Tensor, lst_code_length_tuple: Union[List[Tuple[int, float]], Tuple[torch.Tensor, torch.Tensor]]) -> torch.Tensor:
         """
         evaluates L2 loss of the predicted code length and true code length in a normalized scale.
 
         :param t_prob_c_batch: probability array of p(c_n=m|x); (n_batch, n_digits, n_ary)
-        :param lst_hyponymy_tuple: list of (entity index, entity depth) tuples
+        :param lst_hyponymy_tuple: list of (entity index, entity depth) tuples, or its collated form: collate_code_length_tuples()
         """
 
         # x: hypernym, y: hyponym
         dtype, device = self._dtype_and_device(t_prob_c_batch)
 
-        t_idx = torch.tensor([tup[0] for tup in lst_code_length_tuple], dtype=torch.long, device=device)
-        y_true = torch.tensor([tup[1] for tup in lst_code_length_tuple], dtype=dtype, device=device)
+        t_idx, y_true = self._unpack_tuples(lst_code_length_tuple, n_index_columns=1, dtype=dtype, device=device)
+
+        return self.forward_t(t_prob_c_batch, t_idx, y_true)
+
+    def forward_t(self, t_prob_c_batch: torch.Tensor, t_idx: torch.Tensor, y_true: torch.Tensor) -> torch.Tensor:
+        """
+        tensor-native version of forward(). all tensors must be on the same device as t_prob_c_batch.
+
+        :param t_prob_c_batch: probability array of p(c_n=m|x); (n_batch, n_digits, n_ary)
+        :param t_idx: entity index; (n,) long tensor
+        :param y_true: entity depth; (n,) tensor. it is not modified.
+        """
+        return self._call_forward_impl(t_prob_c_batch, t_idx, y_true) * self._scale
+
+    def _forward_impl(self, t_prob_c_batch: torch.Tensor, t_idx: torch.Tensor, y_true: torch.Tensor) -> torch.Tensor:
 
         # t_prob_c_batch: (N_b, N_digits, N_ary); t_prob_c_batch[b,n,m] = p(c_n=m|x_b)
-        t_prob_c = torch.index_select(t_prob_c_batch, dim=0, index=t_idx)
+        t_prob_c = self._to_compute_dtype(torch.index_select(t_prob_c_batch, dim=0, index=t_idx))
 
         # y_pred: (len(lst_code_length_tuple),)
         # y_true: (len(lst_code_length_tuple),)
-        y_pred = self.calc_soft_code_length(t_prob_c=t_prob_c)
+        y_pred = self.calc_soft_code_length(t_prob_c=t_prob_c).to(y_true.dtype)
 
         # scale ground-truth value and predicted value
         if self._normalize_code_length:
@@ -164,28 +476,45 @@ class CodeLengthPredictionLoss(L._Loss):
             n_digits = t_prob_c_batch.shape[1]
             y_pred /= n_digits
             # scale ground-truth value by the user-specified value.
-            y_true *= self._normalize_coef_for_gt
+            y_true = y_true * self._normalize_coef_for_gt
 
         loss = self._func_distance(y_pred, y_true)
 
-        return loss * self._scale
+        return loss
 
 
 class CodeLengthDiffPredictionLoss(CodeLengthPredictionLoss):
 
-    def forward(self, t_prob_c_batch: torch.Tensor, lst_code_length_diff_tuple: List[Tuple[int, int, float]]) -> torch.Tensor:
+    @staticmethod
+    def collate_code_length_diff_tuples(lst_code_length_diff_tuple) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        # (hypernym index, hyponym index, depth diff) -> (index tensor, index tensor, diff tensor)
+        return CodeLengthPredictionLoss.collate_tuples(lst_code_length_diff_tuple, n_index_columns=2)
+
+    def forward(self, t_prob_c_batch: torch.Tensor, lst_code_length_diff_tuple: Union[List[Tuple[int, int, float]], Tuple[torch.Tensor, ...]]) -> torch.Tensor:
 
         # x: hypernym, y: hyponym
         dtype, device = self._dtype_and_device(t_prob_c_batch)
 
-        t_idx_x = torch.tensor([tup[0] for tup in lst_code_length_diff_tuple], dtype=torch.long, device=device)
-        t_idx_y = torch.tensor([tup[1] for tup in lst_code_length_diff_tuple], dtype=torch.long, device=device)
-        y_true = torch.tensor([tup[2] for tup in lst_code_length_diff_tuple], dtype=dtype, device=device)
+        t_idx_x, t_idx_y, y_true = self._unpack_tuples(lst_code_length_diff_tuple, n_index_columns=2, dtype=dtype, device=device)
+
+        return self.forward_t(t_prob_c_batch, t_idx_x, t_idx_y, y_true)
+
+    def forward_t(self, t_prob_c_batch: torch.Tensor, t_idx_x: torch.Tensor, t_idx_y: torch.Tensor, y_true: torch.Tensor) -> torch.Tensor:
+        """
+        tensor-native version of forward(). all tensors must be on the same device as t_prob_c_batch.
+
+        :param t_prob_c_batch: probability array of p(c_n=m|x); (n_batch, n_digits, n_ary)
+        :param t_idx_x: hypernym index; (n,) long tensor
+        :param t_idx_y: hyponym index; (n,) long tensor
+        :param y_true: ground-truth value; (n,) tensor. it is not modified.
+        """
+        return self._call_forward_impl(t_prob_c_batch, t_idx_x, t_idx_y, y_true) * self._scale
+
+    def _forward_impl(self, t_prob_c_batch: torch.Tensor, t_idx_x: torch.Tensor, t_idx_y: torch.Tensor, y_true: torch.Tensor) -> torch.Tensor:
 
         # compute diff of code length
-        t_code_length = self.calc_soft_code_length(t_prob_c=t_prob_c_batch)
-        t_code_length_x = torch.index_select(t_code_length, dim=0, index=t_idx_x)
-        t_code_length_y = torch.index_select(t_code_length, dim=0, index=t_idx_y)
+        t_code_length = self.calc_soft_code_length(t_prob_c=self._to_compute_dtype(t_prob_c_batch)).to(y_true.dtype)
+        t_code_length_x, t_code_length_y = self._index_select_pair(t_code_length, t_idx_x, t_idx_y)
         # code length diff = len(hyponym:y) - len(hypernym:x)
         y_pred = t_code_length_y - t_code_length_x
 
@@ -195,112 +524,109 @@ class CodeLengthDiffPredictionLoss(CodeLengthPredictionLoss):
             n_digits = t_prob_c_batch.shape[1]
             y_pred /= n_digits
             # scale ground-truth value by the user-specified value.
-            y_true *= self._normalize_coef_for_gt
+            y_true = y_true * self._normalize_coef_for_gt
 
         loss = self._func_distance(y_pred, y_true)
 
-        return loss * self._scale
+        return loss
 
 
 class HyponymyScoreLoss(CodeLengthPredictionLoss):
 
+    # compiled hyponymy score functions shared by all instances. key: (n_digits, n_ary, dtype)
+    _compiled_functions = {}
+
     def __init__(self, scale: float = 1.0, normalize_hyponymy_score: bool = False, normalize_coefficient_for_ground_truth: float = 1.0,
                  distance_metric: str = "scaled-mse",
+                 use_torch_compile: bool = False, compile_forward: bool = False, use_bf16: bool = False, use_triton: bool = False,
+                 use_torch_script: bool = False,
                  size_average=None, reduce=None, reduction='mean') -> None:
+        """
+        :param use_torch_compile: fuse the computation of soft hyponymy score using torch.compile(). it requires PyTorch 2.0 or later.
+        :param compile_forward: compile the tensor part of the forward computation. see CodeLengthPredictionLoss.
+        :param use_bf16: compute the predicted value in bfloat16. see CodeLengthPredictionLoss.
+        :param use_triton: use fused triton kernels on CUDA tensors. see CodeLengthPredictionLoss.
+        :param use_torch_script: compile the distance function using torch.jit.script(). see CodeLengthPredictionLoss.
+        """
 
         super(HyponymyScoreLoss, self).__init__(scale=scale,
                     normalize_coefficient_for_ground_truth=normalize_coefficient_for_ground_truth,
-                    distance_metric=distance_metric,
+                    distance_metric=distance_metric, compile_forward=compile_forward, use_bf16=use_bf16, use_triton=use_triton,
+                    use_torch_script=use_torch_script,
                     size_average=size_average, reduce=reduce, reduction=reduction)
 
         self._normalize_hyponymy_score = normalize_hyponymy_score
+        if use_torch_compile and not hasattr(torch, "compile"):
+            raise NotImplementedError(f"torch.compile() is not available on PyTorch {torch.__version__}.")
+        self._use_torch_compile = use_torch_compile
 
-    def _calc_break_intensity(self, t_prob_c_x: torch.Tensor, t_prob_c_y: torch.Tensor):
-        # x: hypernym, y: hyponym
+    @staticmethod
+    def collate_hyponymy_tuples(lst_hyponymy_tuple) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        # (hypernym index, hyponym index, value) -> (index tensor, index tensor, value tensor)
+        return CodeLengthPredictionLoss.collate_tuples(lst_hyponymy_tuple, n_index_columns=2)
 
-        # t_p_c_*_zero: (n_batch, n_digits)
-        idx_zero = torch.tensor(0, device=t_prob_c_x.device)
-        t_p_c_x_zero = torch.index_select(t_prob_c_x, dim=-1, index=idx_zero).squeeze()
-        t_p_c_y_zero = torch.index_select(t_prob_c_y, dim=-1, index=idx_zero).squeeze()
+    def _compiled_soft_hyponymy_score(self, t_prob_c: torch.Tensor):
+        key = tuple(t_prob_c.shape[-2:]) + (t_prob_c.dtype,)
+        if key not in self._compiled_functions:
+            self._compiled_functions[key] = torch.compile(_soft_hyponymy_score, fullgraph=True)
+        return self._compiled_functions[key]
 
-        ret = 1.0 - (torch.sum(t_prob_c_x * t_prob_c_y, dim=-1) - t_p_c_x_zero * t_p_c_y_zero)
-        return ret
+    def _calc_break_intensity(self, t_prob_c_x: torch.Tensor, t_prob_c_y: torch.Tensor):
+        return _break_intensity(t_prob_c_x, t_prob_c_y)
 
     def calc_ancestor_probability(self, t_prob_c_x: torch.Tensor, t_prob_c_y: torch.Tensor):
-        n_digits, n_ary = t_prob_c_x.shape[-2:]
-        dtype, device = self._dtype_and_device(t_prob_c_x)
-
-        # t_p_c_*_zero: (n_batch, n_digits)
-        idx_zero = torch.tensor(0, device=t_prob_c_x.device)
-        t_p_c_x_zero = torch.index_select(t_prob_c_x, dim=-1, index=idx_zero).squeeze()
-        t_p_c_y_zero = torch.index_select(t_prob_c_y, dim=-1, index=idx_zero).squeeze()
-        # t_beta: (n_batch, n_digits)
-        t_beta = t_p_c_x_zero*(1.- t_p_c_y_zero)
-
-        # t_gamma_hat: (n_batch, n_digits)
-        t_gamma_hat = torch.sum(t_prob_c_x*t_prob_c_y, dim=-1) - t_p_c_x_zero*t_p_c_y_zero
-        # prepend 1.0 at the beginning
-        # pad_shape: (n_batch, 1)
-        pad_shape = t_gamma_hat.shape[:-1] + (1,)
-        t_pad_begin = torch.ones(pad_shape, dtype=dtype, device=device)
-        # t_gamma: (n_batch, n_digits)
-        t_gamma = torch.narrow(torch.cat((t_pad_begin, t_gamma_hat), dim=-1), dim=-1, start=0, length=n_digits)
-        # t_prob: (n_batch,)
-        t_prob = torch.sum(t_beta*torch.cumprod(t_gamma, dim=-1), dim=-1)
-
-        return t_prob
+        if self._use_triton and t_prob_c_x.is_cuda:
+            return triton_kernels.ancestor_probability_triton(t_prob_c_x, t_prob_c_y)
+        return _ancestor_probability(t_prob_c_x, t_prob_c_y)
 
     def calc_soft_lowest_common_ancestor_length(self, t_prob_c_x: torch.Tensor, t_prob_c_y: torch.Tensor):
-        n_digits, n_ary = t_prob_c_x.shape[-2:]
-        dtype, device = self._dtype_and_device(t_prob_c_x)
-
-        t_break_intensity = self._calc_break_intensity(t_prob_c_x, t_prob_c_y)
-        t_prob_break = self._intensity_to_probability(t_break_intensity)
-
-        t_at_n = torch.arange(n_digits+1, dtype=dtype, device=device)
-        ret = torch.sum(t_prob_break * t_at_n, dim=-1)
-
-        return ret
+        return _soft_lowest_common_ancestor_length(t_prob_c_x, t_prob_c_y, self._get_digit_positions(t_prob_c_x))
 
     def calc_soft_hyponymy_score(self, t_prob_c_x: torch.Tensor, t_prob_c_y: torch.Tensor):
         # calculate soft hyponymy score
         # x: hypernym, y: hyponym
         # t_prob_c_*[b,n,v] = Pr{C_n=v|x_b}; t_prob_c_*: (n_batch, n_digits, n_ary)
-
-        # l_hyper, l_hypo = hypernym / hyponym code length
-        l_hyper = self.calc_soft_code_length(t_prob_c_x)
-        l_hypo = self.calc_soft_code_length(t_prob_c_y)
-        # alpha = probability of hyponymy relation
-        alpha = self.calc_ancestor_probability(t_prob_c_x, t_prob_c_y)
-        # l_lca = length of the lowest common ancestor
-        l_lca = self.calc_soft_lowest_common_ancestor_length(t_prob_c_x, t_prob_c_y)
-
-        score = alpha * (l_hypo - l_hyper) + (1. - alpha) * (l_lca - l_hyper)
-
-        return score
-
-    def forward(self, t_prob_c_batch: torch.Tensor, lst_hyponymy_tuple: List[Tuple[int, int, float]]) -> torch.Tensor:
+        t_at_n = self._get_digit_positions(t_prob_c_x)
+        if self._use_triton and t_prob_c_x.is_cuda:
+            l_hyper, l_hypo = self.calc_soft_code_length_pair(t_prob_c_x, t_prob_c_y)
+            return _soft_hyponymy_score_from_code_length(l_hyper, l_hypo, t_prob_c_x, t_prob_c_y, t_at_n)
+        if self._use_torch_compile:
+            return self._compiled_soft_hyponymy_score(t_prob_c_x)(t_prob_c_x, t_prob_c_y, t_at_n)
+        return _soft_hyponymy_score(t_prob_c_x, t_prob_c_y, t_at_n)
+
+    def forward(self, t_prob_c_batch: torch.Tensor, lst_hyponymy_tuple: Union[List[Tuple[int, int, float]], Tuple[torch.Tensor, ...]]) -> torch.Tensor:
         """
         evaluates loss of the predicted hyponymy score and true hyponymy score.
 
         :param t_prob_c_batch: probability array. shape: (n_batch, n_digits, n_ary), t_prob_c_batch[b,n,m] = p(c_n=m|x_b)
-        :param lst_hyponymy_tuple: list of (hypernym index, hyponym index, hyponymy score) tuples
+        :param lst_hyponymy_tuple: list of (hypernym index, hyponym index, hyponymy score) tuples, or its collated form: collate_hyponymy_tuples()
         """
 
         # x: hypernym, y: hyponym
         dtype, device = self._dtype_and_device(t_prob_c_batch)
 
-        # clamp values so that it won't produce nan value.
-        t_prob_c_batch = torch.clamp(t_prob_c_batch, min=1E-5, max=(1.0-1E-5))
+        t_idx_x, t_idx_y, y_true = self._unpack_tuples(lst_hyponymy_tuple, n_index_columns=2, dtype=dtype, device=device)
 
-        t_idx_x = torch.tensor([tup[0] for tup in lst_hyponymy_tuple], dtype=torch.long, device=device)
-        t_idx_y = torch.tensor([tup[1] for tup in lst_hyponymy_tuple], dtype=torch.long, device=device)
-        y_true = torch.tensor([tup[2] for tup in lst_hyponymy_tuple], dtype=dtype, device=device)
+        return self.forward_t(t_prob_c_batch, t_idx_x, t_idx_y, y_true)
 
-        t_prob_c_x = torch.index_select(t_prob_c_batch, dim=0, index=t_idx_x)
-        t_prob_c_y = torch.index_select(t_prob_c_batch, dim=0, index=t_idx_y)
+    def forward_t(self, t_prob_c_batch: torch.Tensor, t_idx_x: torch.Tensor, t_idx_y: torch.Tensor, y_true: torch.Tensor) -> torch.Tensor:
+        """
+        tensor-native version of forward(). all tensors must be on the same device as t_prob_c_batch.
+
+        :param t_prob_c_batch: probability array of p(c_n=m|x); (n_batch, n_digits, n_ary)
+        :param t_idx_x: hypernym index; (n,) long tensor
+        :param t_idx_y: hyponym index; (n,) long tensor
+        :param y_true: ground-truth value; (n,) tensor. it is not modified.
+        """
+        return self._call_forward_impl(t_prob_c_batch, t_idx_x, t_idx_y, y_true) * self._scale
 
-        y_pred = self.calc_soft_hyponymy_score(t_prob_c_x, t_prob_c_y)
+    def _forward_impl(self, t_prob_c_batch: torch.Tensor, t_idx_x: torch.Tensor, t_idx_y: torch.Tensor, y_true: torch.Tensor) -> torch.Tensor:
+
+        # clamp values so that it won't produce nan value.
+        t_prob_c_x, t_prob_c_y = self._index_select_pair(t_prob_c_batch, t_idx_x, t_idx_y, clamp_range=(1E-5, 1.0-1E-5))
+        t_prob_c_x, t_prob_c_y = self._to_compute_dtype(t_prob_c_x), self._to_compute_dtype(t_prob_c_y)
+
+        y_pred = self.calc_soft_hyponymy_score(t_prob_c_x, t_prob_c_y).to(y_true.dtype)
 
         # scale ground-truth value and predicted value
         if self._normalize_hyponymy_score:
@@ -308,34 +634,36 @@ class HyponymyScoreLoss(CodeLengthPredictionLoss):
             n_digits = t_prob_c_batch.shape[1]
             y_pred /= n_digits
             # scale ground-truth value by the user-specified value.
-            y_true *= self._normalize_coef_for_gt
+            y_true = y_true * self._normalize_coef_for_gt
 
         loss = self._func_distance(y_pred, y_true)
 
-        return loss * self._scale
+        return loss
 
 
 class LowestCommonAncestorLengthPredictionLoss(HyponymyScoreLoss):
 
-    def forward(self, t_prob_c_batch: torch.Tensor, lst_hyponymy_tuple: List[Tuple[int, int, float]]) -> torch.Tensor:
+    def forward(self, t_prob_c_batch: torch.Tensor, lst_hyponymy_tuple: Union[List[Tuple[int, int, float]], Tuple[torch.Tensor, ...]]) -> torch.Tensor:
         """
         evaluates loss of the predicted and ground-truth value of the length of the lowest common ancestor.
 
         :param t_prob_c_batch: probability array. shape: (n_batch, n_digits, n_ary), t_prob_c_batch[b,n,m] = p(c_n=m|x_b)
-        :param lst_hyponymy_tuple: list of (hypernym index, hyponym index, length of lowest  common ancestor) tuples
+        :param lst_hyponymy_tuple: list of (hypernym index, hyponym index, length of lowest  common ancestor) tuples, or its collated form: collate_hyponymy_tuples()
         """
 
         # x: hypernym, y: hyponym
         dtype, device = self._dtype_and_device(t_prob_c_batch)
 
-        t_idx_x = torch.tensor([tup[0] for tup in lst_hyponymy_tuple], dtype=torch.long, device=device)
-        t_idx_y = torch.tensor([tup[1] for tup in lst_hyponymy_tuple], dtype=torch.long, device=device)
-        y_true = torch.tensor([tup[2] for tup in lst_hyponymy_tuple], dtype=dtype, device=device)
+        t_idx_x, t_idx_y, y_true = self._unpack_tuples(lst_hyponymy_tuple, n_index_columns=2, dtype=dtype, device=device)
 
-        t_prob_c_x = torch.index_select(t_prob_c_batch, dim=0, index=t_idx_x)
-        t_prob_c_y = torch.index_select(t_prob_c_batch, dim=0, index=t_idx_y)
+        return self.forward_t(t_prob_c_batch, t_idx_x, t_idx_y, y_true)
 
-        y_pred = self.calc_soft_lowest_common_ancestor_length(t_prob_c_x, t_prob_c_y)
+    def _forward_impl(self, t_prob_c_batch: torch.Tensor, t_idx_x: torch.Tensor, t_idx_y: torch.Tensor, y_true: torch.Tensor) -> torch.Tensor:
+
+        t_prob_c_x, t_prob_c_y = self._index_select_pair(t_prob_c_batch, t_idx_x, t_idx_y)
+        t_prob_c_x, t_prob_c_y = self._to_compute_dtype(t_prob_c_x), self._to_compute_dtype(t_prob_c_y)
+
+        y_pred = self.calc_soft_lowest_common_ancestor_length(t_prob_c_x, t_prob_c_y).to(y_true.dtype)
 
         # scale ground-truth value and predicted value
         if self._normalize_hyponymy_score:
@@ -343,44 +671,45 @@ class LowestCommonAncestorLengthPredictionLoss(HyponymyScoreLoss):
             n_digits = t_prob_c_batch.shape[1]
             y_pred /= n_digits
             # scale ground-truth value by the user-specified value.
-            y_true *= self._normalize_coef_for_gt
+            y_true = y_true * self._normalize_coef_for_gt
 
         loss = self._func_distance(y_pred, y_true)
 
-        return loss * self._scale
+        return loss
 
 
 class EntailmentProbabilityLoss(HyponymyScoreLoss):
 
-    def __init__(self, scale: float = 1.0, size_average=None, reduce=None, reduction='mean') -> None:
+    def __init__(self, scale: float = 1.0, compile_forward: bool = False, use_bf16: bool = False, use_triton: bool = False,
+                 size_average=None, reduce=None, reduction='mean') -> None:
 
         super(EntailmentProbabilityLoss, self).__init__(scale=scale,
-                    distance_metric="binary-cross-entropy",
+                    distance_metric="binary-cross-entropy", compile_forward=compile_forward, use_bf16=use_bf16, use_triton=use_triton,
                     size_average=size_average, reduce=reduce, reduction=reduction)
 
-    def forward(self, t_prob_c_batch: torch.Tensor, lst_hyponymy_tuple: List[Tuple[int, int, float]]) -> torch.Tensor:
+    def forward(self, t_prob_c_batch: torch.Tensor, lst_hyponymy_tuple: Union[List[Tuple[int, int, float]], Tuple[torch.Tensor, ...]]) -> torch.Tensor:
         """
         evaluates loss of the predicted hyponymy score and true hyponymy score.
 
         :param t_prob_c_batch: probability array. shape: (n_batch, n_digits, n_ary), t_prob_c_batch[b,n,m] = p(c_n=m|x_b)
-        :param lst_hyponymy_tuple: list of (hypernym index, hyponym index, hyponymy(=1.0) or not(=0.0)) tuples
+        :param lst_hyponymy_tuple: list of (hypernym index, hyponym index, hyponymy(=1.0) or not(=0.0)) tuples, or its collated form: collate_hyponymy_tuples()
         """
 
         # x: hypernym, y: hyponym
         dtype, device = self._dtype_and_device(t_prob_c_batch)
 
-        # clamp values so that it won't produce nan value.
-        t_prob_c_batch = torch.clamp(t_prob_c_batch, min=1E-5, max=(1.0-1E-5))
+        t_idx_x, t_idx_y, y_true = self._unpack_tuples(lst_hyponymy_tuple, n_index_columns=2, dtype=dtype, device=device)
+
+        return self.forward_t(t_prob_c_batch, t_idx_x, t_idx_y, y_true)
 
-        t_idx_x = torch.tensor([tup[0] for tup in lst_hyponymy_tuple], dtype=torch.long, device=device)
-        t_idx_y = torch.tensor([tup[1] for tup in lst_hyponymy_tuple], dtype=torch.long, device=device)
-        y_true = torch.tensor([tup[2] for tup in lst_hyponymy_tuple], dtype=dtype, device=device)
+    def _forward_impl(self, t_prob_c_batch: torch.Tensor, t_idx_x: torch.Tensor, t_idx_y: torch.Tensor, y_true: torch.Tensor) -> torch.Tensor:
 
-        t_prob_c_x = torch.index_select(t_prob_c_batch, dim=0, index=t_idx_x)
-        t_prob_c_y = torch.index_select(t_prob_c_batch, dim=0, index=t_idx_y)
+        # clamp values so that it won't produce nan value.
+        t_prob_c_x, t_prob_c_y = self._index_select_pair(t_prob_c_batch, t_idx_x, t_idx_y, clamp_range=(1E-5, 1.0-1E-5))
+        t_prob_c_x, t_prob_c_y = self._to_compute_dtype(t_prob_c_x), self._to_compute_dtype(t_prob_c_y)
 
-        y_pred = self.calc_ancestor_probability(t_prob_c_x, t_prob_c_y)
+        y_pred = self.calc_ancestor_probability(t_prob_c_x, t_prob_c_y).to(y_true.dtype)
 
         loss = self._func_distance(y_pred, y_true)
 
-        return loss * self._scale
+        return loss
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# fused triton kernels of the soft code length and related quantities.
+# triton is optional. use `is_available()` before calling the functions defined here.
+
+import torch
+from torch.autograd import Function
+from torch.nn import functional as F
+
+try:
+    import triton
+    import triton.language as tl
+except ImportError:
+    triton = None
+    tl = None
+
+
+def is_available() -> bool:
+    return triton is not None
+
+
+if triton is not None:
+
+    @triton.autotune(configs=[triton.Config({"BLOCK_B": block_b}, num_warps=num_warps)
+                              for block_b, num_warps in ((16, 1), (32, 2), (64, 4), (128, 4))],
+                     key=["n_digits"])
+    @triton.jit
+    def _soft_code_length_kernel(p_ptr, out_ptr, n_batch, n_digits, stride_b, stride_d,
+                                 BLOCK_B: tl.constexpr, BLOCK_D: tl.constexpr):
+        # each program processes BLOCK_B rows. whole digits of a row are kept in registers.
+        offs_b = tl.program_id(0) * BLOCK_B + tl.arange(0, BLOCK_B)
+        offs_d = tl.arange(0, BLOCK_D)
+        mask = (offs_b[:,None] < n_batch) & (offs_d[None,:] < n_digits)
+        # padded digits are filled with one, then the survival probability vanishes after the last digit.
+        t_p = tl.load(p_ptr + offs_b[:,None]*stride_b + offs_d[None,:]*stride_d, mask=mask, other=1.0).to(tl.float32)
+        # E[length] = \sum_{n=1}^{n_digits} Pr{length >= n} = \sum_{n=1}^{n_digits} \prod_{d<n}(1-p[d])
+        t_survival = tl.cumprod(1.0 - t_p, axis=1)
+        t_length = tl.sum(t_survival, axis=1)
+        tl.store(out_ptr + offs_b, t_length.to(out_ptr.dtype.element_ty), mask=offs_b < n_batch)
+
+    @triton.autotune(configs=[triton.Config({"BLOCK_B": block_b}, num_warps=num_warps)
+                              for block_b, num_warps in ((16, 1), (32, 2), (64, 4), (128, 4))],
+                     key=["n_digits", "n_ary"])
+    @triton.jit
+    def _ancestor_probability_kernel(x_ptr, y_ptr, out_ptr, n_batch, n_digits, n_ary,
+                                     stride_x_b, stride_x_d, stride_x_a, stride_y_b, stride_y_d, stride_y_a,
+                                     BLOCK_B: tl.constexpr, BLOCK_A: tl.constexpr):
+        # each program processes BLOCK_B rows and scans over the digits once.
+        # the state of the prefix product is kept in registers.
+        offs_b = tl.program_id(0) * BLOCK_B + tl.arange(0, BLOCK_B)
+        offs_a = tl.arange(0, BLOCK_A)
+        mask = (offs_b[:,None] < n_batch) & (offs_a[None,:] < n_ary)
+        is_zero = (offs_a == 0)[None,:]
+        t_prefix = tl.full((BLOCK_B,), 1.0, dtype=tl.float32)
+        t_prob = tl.zeros((BLOCK_B,), dtype=tl.float32)
+        for d in range(0, n_digits):
+            t_x = tl.load(x_ptr + offs_b[:,None]*stride_x_b + d*stride_x_d + offs_a[None,:]*stride_x_a, mask=mask, other=0.0).to(tl.float32)
+            t_y = tl.load(y_ptr + offs_b[:,None]*stride_y_b + d*stride_y_d + offs_a[None,:]*stride_y_a, mask=mask, other=0.0).to(tl.float32)
+            t_x_zero = tl.sum(tl.where(is_zero, t_x, 0.0), axis=1)
+            t_y_zero = tl.sum(tl.where(is_zero, t_y, 0.0), axis=1)
+            # beta = p(x_d=0)*(1-p(y_d=0)), gamma_hat = p(x_d=y_d!=0)
+            t_prob += t_x_zero * (1.0 - t_y_zero) * t_prefix
+            t_prefix *= tl.sum(t_x * t_y, axis=1) - t_x_zero * t_y_zero
+        tl.store(out_ptr + offs_b, t_prob.to(out_ptr.dtype.element_ty), mask=offs_b < n_batch)
+
+
+def _soft_code_length_eager(t_p_c_zero: torch.Tensor) -> torch.Tensor:
+    # same quantity as the kernel. it is used for the backward computation.
+    return torch.sum(torch.cumprod(1.0 - t_p_c_zero, dim=-1), dim=-1)
+
+
+def _ancestor_probability_eager(t_prob_c_x: torch.Tensor, t_prob_c_y: torch.Tensor) -> torch.Tensor:
+    # same quantity as the kernel. it is used for the backward computation.
+    t_x_zero, t_y_zero = t_prob_c_x[...,0], t_prob_c_y[...,0]
+    t_gamma_hat = torch.sum(t_prob_c_x * t_prob_c_y, dim=-1) - t_x_zero * t_y_zero
+    t_gamma = F.pad(t_gamma_hat[...,:-1], (1,0), value=1.0)
+    return torch.sum(t_x_zero * (1.0 - t_y_zero) * torch.cumprod(t_gamma, dim=-1), dim=-1)
+
+
+class SoftCodeLengthFunction(Function):
+    """
+    computes the soft code length from the probability of zero, p(c_n=0|x), using the fused triton kernel.
+    gradient is computed by recomputing the eager implementation.
+    """
+
+    @staticmethod
+    def forward(ctx, t_p_c_zero: torch.Tensor):
+        # t_p_c_zero: (n_batch, n_digits). strided input such as t_prob_c[...,0] is accepted without copy.
+        n_batch, n_digits = t_p_c_zero.shape
+        t_length = torch.empty((n_batch,), dtype=t_p_c_zero.dtype, device=t_p_c_zero.device)
+        grid = lambda meta: (triton.cdiv(n_batch, meta["BLOCK_B"]),)
+        _soft_code_length_kernel[grid](t_p_c_zero, t_length, n_batch, n_digits, t_p_c_zero.stride(0), t_p_c_zero.stride(1),
+                                       BLOCK_D=triton.next_power_of_2(n_digits))
+        ctx.save_for_backward(t_p_c_zero)
+        return t_length
+
+    @staticmethod
+    def backward(ctx, grad_output):
+        t_p_c_zero, = ctx.saved_tensors
+        with torch.enable_grad():
+            t_p_c_zero = t_p_c_zero.detach().requires_grad_()
+            t_length = _soft_code_length_eager(t_p_c_zero)
+            grad_input, = torch.autograd.grad(t_length, t_p_c_zero, grad_output)
+        return grad_input
+
+
+def soft_code_length_triton(t_p_c_zero: torch.Tensor) -> torch.Tensor:
+    """
+    soft code length: sum_{n=0}^{n_digits} n * Pr{length = n}
+
+    :param t_p_c_zero: probability of zero at each digit, p(c_n=0|x); (n_batch, n_digits)
+    :return: (n_batch,)
+    """
+    return SoftCodeLengthFunction.apply(t_p_c_zero)
+
+
+class AncestorProbabilityFunction(Function):
+    """
+    computes the probability that x is the ancestor of y using the fused triton kernel.
+    gradient is computed by recomputing the eager implementation.
+    """
+
+    @staticmethod
+    def forward(ctx, t_prob_c_x: torch.Tensor, t_prob_c_y: torch.Tensor):
+        # t_prob_c_*: (n_batch, n_digits, n_ary)
+        n_batch, n_digits, n_ary = t_prob_c_x.shape
+        t_prob = torch.empty((n_batch,), dtype=t_prob_c_x.dtype, device=t_prob_c_x.device)
+        grid = lambda meta: (triton.cdiv(n_batch, meta["BLOCK_B"]),)
+        _ancestor_probability_kernel[grid](t_prob_c_x, t_prob_c_y, t_prob, n_batch, n_digits, n_ary,
+                                           *t_prob_c_x.stride(), *t_prob_c_y.stride(),
+                                           BLOCK_A=triton.next_power_of_2(n_ary))
+        ctx.save_for_backward(t_prob_c_x, t_prob_c_y)
+        return t_prob
+
+    @staticmethod
+    def backward(ctx, grad_output):
+        t_prob_c_x, t_prob_c_y = ctx.saved_tensors
+        with torch.enable_grad():
+            t_prob_c_x = t_prob_c_x.detach().requires_grad_()
+            t_prob_c_y = t_prob_c_y.detach().requires_grad_()
+            t_prob = _ancestor_probability_eager(t_prob_c_x, t_prob_c_y)
+            grad_x, grad_y = torch.autograd.grad(t_prob, (t_prob_c_x, t_prob_c_y), grad_output)
+        return grad_x, grad_y
+
+
+def ancestor_probability_triton(t_prob_c_x: torch.Tensor, t_prob_c_y: torch.Tensor) -> torch.Tensor:
+    """
+    probability that x is the ancestor (=hypernym) of y.
+
+    :param t_prob_c_x: code probability of hypernym; (n_batch, n_digits, n_ary)
+    :param t_prob_c_y: code probability of hyponym; (n_batch, n_digits, n_ary)
+    :return: (n_batch,)
+    """
+    return AncestorProbabilityFunction.apply(t_prob_c_x, t_prob_c_y)
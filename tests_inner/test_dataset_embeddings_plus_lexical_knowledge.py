@@ -6,16 +6,21 @@ from __future__ import division
 from __future__ import print_function
 
 import warnings
+from collections import Counter
 warnings.simplefilter("ignore", category=ImportWarning)
 
 import numpy as np
+import torch
 from torch.utils.data import DataLoader
 import sys, io, os
+import tempfile
 import unittest
 from dataset.lexical_knowledge import HyponymyDataset
 from dataset.word_embeddings import Word2VecDataset, GeneralPurposeEmbeddingsDataset
 from dataset.transform import FieldTypeConverter
+from dataset.filter import DictionaryFilter
 from dataset.embeddings_plus_lexical_knowledge import WordEmbeddingsAndHyponymyDataset, WordEmbeddingsAndHyponymyDatasetWithNonHyponymyRelation
+from dataset.embeddings_plus_lexical_knowledge import IterableWordEmbeddingsAndHyponymyDataset
 
 from config_files.word_embeddings import DIR_WORD_EMBEDDINGS
 from config_files.lexical_knowledge_datasets_nguyen import DIR_LEXICAL_KNOWLEDGE
@@ -104,7 +109,7 @@ class WordEmbeddingsAndHyponymyDatasetTestCases(unittest.TestCase):
 
                 with self.subTest(hyponym=hyponym, hypernym=hypernym):
                     entry = (idx_hyper, idx_hypo, distance)
-                    found = any([entry == hyponymy for hyponymy in hyponymy_relation])
+                    found = any([entry == tuple(hyponymy) for hyponymy in hyponymy_relation])
                     self.assertTrue(found)
 
 
@@ -197,7 +202,7 @@ class WordEmbeddingsAndHyponymyDatasetWithNonHyponymyRelationTestCases(unittest.
 
                 with self.subTest(hyponym=hyponym, hypernym=hypernym):
                     entry = (idx_hyper, idx_hypo, distance)
-                    found = any([entry == hyponymy for hyponymy in hyponymy_relation])
+                    found = any([entry == tuple(hyponymy) for hyponymy in hyponymy_relation])
                     self.assertTrue(found)
 
     def test_batch_non_hyponymy_entity_consistency(self):
@@ -218,6 +223,7 @@ class WordEmbeddingsAndHyponymyDatasetWithNonHyponymyRelationTestCases(unittest.
             set_hyponymy_relation.add(tup_rev)
 
         for idx_hyper, idx_hypo, distance in non_hyponymy_relation:
+            idx_hyper, idx_hypo = int(idx_hyper), int(idx_hypo)
             hypernym = entity[idx_hyper]
             hyponym = entity[idx_hypo]
             tup_non_hyponymy = (hypernym, hyponym)
@@ -247,6 +253,105 @@ class WordEmbeddingsAndHyponymyDatasetWithNonHyponymyRelationTestCases(unittest.
                     distance_gt = self._dataset._non_hyponymy_relation_distance
                 self.assertEqual(distance, distance_gt)
 
+    def test_iterable_dataset_without_duplicates(self):
+
+        dataset = WordEmbeddingsAndHyponymyDataset(self._word_embeddings, self._lexical_knowledge,
+                                                   embedding_batch_size=400, hyponymy_batch_size=200, shuffle=True)
+        iterable_dataset = IterableWordEmbeddingsAndHyponymyDataset(dataset)
+        # unknown attributes are delegated to the wrapped dataset
+        iterable_dataset.shuffle_hyponymy_dataset()
+
+        def _hyponymy_pairs(dataloader):
+            return Counter((sample["hyponym"], sample["hypernym"]) for batch in dataloader for sample in batch["hyponymy_relation_raw"])
+
+        counter_gt = _hyponymy_pairs(iterable_dataset.create_dataloader(num_workers=0))
+        counter = _hyponymy_pairs(iterable_dataset.create_dataloader(num_workers=2, persistent_workers=False))
+
+        self.assertEqual(sum(counter_gt.values()), int(dataset._encodable_mask.sum()))
+        self.assertEqual(counter, counter_gt)
+
+    def test_encodable_mask_cache(self):
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            # first one builds the cache, second one loads it.
+            lst_masks = []
+            for _ in range(2):
+                dataset = WordEmbeddingsAndHyponymyDataset(self._word_embeddings, self._lexical_knowledge,
+                                                           embedding_batch_size=40, hyponymy_batch_size=4,
+                                                           encodable_mask_cache_dir=cache_dir)
+                lst_masks.append(dataset._encodable_mask.numpy())
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+        mask_gt = np.array([self._dataset.is_encodable_all(sample["hyponym"], sample["hypernym"]) for sample in self._lexical_knowledge])
+        for mask in lst_masks:
+            self.assertTrue(np.array_equal(mask, mask_gt))
+
+    def test_encodable_mask_cache_with_filter(self):
+
+        # two datasets are loaded from the same file and have the same length, but the filter keeps different pairs.
+        entity_x, entity_y = self._word_embeddings.index_to_entity(0), self._word_embeddings.index_to_entity(1)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            path = os.path.join(cache_dir, "hyponymy.txt")
+            with io.open(path, mode="w") as ofs:
+                ofs.write("hyponym\thypernym\tdistance\tpos\n")
+                ofs.write(f"{entity_x}\t{entity_y}\t1\tn\n")
+                ofs.write(f"__not_encodable__\t{entity_y}\t1\tv\n")
+
+            for excludes, mask_gt in (({"pos":{"v"}}, [True]), ({"pos":{"n"}}, [False])):
+                with self.subTest(excludes=excludes):
+                    lexical_knowledge = HyponymyDataset(path=path, header=True, delimiter="\t", transform=_distance_str_to_float,
+                                                        columns={"hyponym":0, "hypernym":1, "distance":2, "pos":3},
+                                                        filter=DictionaryFilter(excludes=excludes))
+                    dataset = WordEmbeddingsAndHyponymyDataset(self._word_embeddings, lexical_knowledge,
+                                                               embedding_batch_size=4, hyponymy_batch_size=1,
+                                                               encodable_mask_cache_dir=os.path.join(cache_dir, "mask"))
+                    self.assertEqual(dataset._encodable_mask.tolist(), mask_gt)
+
+    def test_iter_encodable_samples(self):
+
+        dataset = WordEmbeddingsAndHyponymyDataset(self._word_embeddings, self._lexical_knowledge,
+                                                   embedding_batch_size=400, hyponymy_batch_size=200, shuffle=True)
+        lst_samples = [sample for batch in dataset for sample in batch["hyponymy_relation_raw"]]
+
+        self.assertEqual(len(lst_samples), int(dataset._encodable_mask.sum()))
+        for sample in lst_samples:
+            self.assertTrue(dataset.is_encodable_all(sample["hyponym"], sample["hypernym"]))
+
+    def test_sample_without_replacement(self):
+
+        dataset = self._dataset
+        rng_cache = dataset._rng
+        population_size = 1000
+        try:
+            # both rejection sampling (low ratio) and permutation (high ratio) are examined.
+            for size in (0, 1, 100, 250, 251, 999, 1000):
+                with self.subTest(size=size):
+                    dataset._rng = np.random.default_rng(0)
+                    samples = dataset._sample_without_replacement(size=size, population_size=population_size)
+                    dataset._rng = np.random.default_rng(0)
+                    samples_again = dataset._sample_without_replacement(size=size, population_size=population_size)
+
+                    self.assertEqual(len(samples), size)
+                    self.assertEqual(len(np.unique(samples)), size)
+                    self.assertTrue(np.all((samples >= 0) & (samples < population_size)))
+                    self.assertTrue(np.array_equal(samples, samples_again))
+        finally:
+            dataset._rng = rng_cache
+
+    def test_embedding_type_with_and_without_buffer(self):
+
+        lst_batches = []
+        for reuse_embedding_buffer in (False, True):
+            dataset = WordEmbeddingsAndHyponymyDataset(self._word_embeddings, self._lexical_knowledge,
+                                                       embedding_batch_size=40, hyponymy_batch_size=4,
+                                                       reuse_embedding_buffer=reuse_embedding_buffer)
+            batch = dataset[0]
+            with self.subTest(reuse_embedding_buffer=reuse_embedding_buffer):
+                self.assertTrue(torch.is_tensor(batch["embedding"]))
+                self.assertEqual(batch["embedding"].dtype, torch.float32)
+            vec_e_gt = self._word_embeddings.get_embeddings(batch["entity"])
+            self.assertTrue(np.array_equal(batch["embedding"].numpy(), vec_e_gt))
+
     def test_entity_depth(self):
 
         batch = self._batch
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import print_function
+
+import io, os
+import tempfile
+import unittest
+import numpy as np
+from dataset.filter import DictionaryFilter
+from dataset.lexical_knowledge import HyponymyDataset
+
+
+class DictionaryFilterTestCases(unittest.TestCase):
+
+    _records = [
+        ("dog", "animal", "1", "n"),
+        ("cat", "animal", "1", "n"),
+        ("run", "move", "1", "v"),
+        ("walk", "move", "1", "v"),
+        ("red", "color", "1", "a"),
+        ("oak", "tree", "1", "n"),
+        ("jog", "run", "1", "v"),
+    ]
+    _columns = {"hyponym":0, "hypernym":1, "distance":2, "pos":3}
+
+    def setUp(self) -> None:
+        self._tempdir = tempfile.TemporaryDirectory()
+        self._path = os.path.join(self._tempdir.name, "hyponymy.txt")
+        with io.open(self._path, mode="w") as ofs:
+            ofs.write("hyponym\thypernym\tdistance\tpos\n")
+            for record in self._records:
+                ofs.write("\t".join(record) + "\n")
+
+        self._filter_args = {
+            "includes": {"includes":{"pos":{"n","a"}, "hypernym":{"move"}}},
+            "excludes": {"excludes":{"pos":{"v"}, "hyponym":{"oak"}}},
+            "includes_no_match": {"includes":{"pos":{"x"}}},
+            "excludes_no_match": {"excludes":{"pos":{"x"}}},
+        }
+        self._filters = {filter_name:DictionaryFilter(**kwargs) for filter_name, kwargs in self._filter_args.items()}
+
+    def tearDown(self) -> None:
+        self._tempdir.cleanup()
+
+    def _load(self, filter=None):
+        return HyponymyDataset(path=self._path, header=True, delimiter="\t", columns=self._columns, filter=filter)
+
+    def _filter_baseline(self, sample, includes=None, excludes=None):
+        # includes: passes if any field value is in the set. excludes: passes unless any field value is in the set.
+        if includes is not None:
+            return any(sample[field_name] in values for field_name, values in includes.items())
+        else:
+            return not any(sample[field_name] in values for field_name, values in excludes.items())
+
+    def test_filter_batch_consistency(self):
+
+        lst_samples = list(self._load())
+        for filter_name, filter_function in self._filters.items():
+            with self.subTest(filter_name=filter_name):
+                columns = {field_name:np.array([sample[field_name] for sample in lst_samples], dtype=object) for field_name in filter_function.field_names}
+                mask = filter_function.filter_batch(columns)
+                mask_single = [filter_function(sample) for sample in lst_samples]
+                mask_gt = [self._filter_baseline(sample, **self._filter_args[filter_name]) for sample in lst_samples]
+
+                self.assertIsInstance(mask, np.ndarray)
+                self.assertEqual(mask.tolist(), mask_gt)
+                self.assertEqual(mask_single, mask_gt)
+
+    def test_mixed_type_values(self):
+
+        # values must be compared as they are, e.g. integer 1 doesn't match with string "1".
+        lst_samples = [{"distance":1}, {"distance":"1"}, {"distance":2.0}, {"distance":"a"}, {"distance":None}]
+        for kwargs in ({"includes":{"distance":{1, "a"}}}, {"excludes":{"distance":{1, "a"}}}, {"includes":{"distance":{2, None}}}):
+            with self.subTest(**kwargs):
+                filter_function = DictionaryFilter(**kwargs)
+                columns = {"distance":np.array([sample["distance"] for sample in lst_samples], dtype=object)}
+                mask_gt = [self._filter_baseline(sample, **kwargs) for sample in lst_samples]
+
+                self.assertEqual(filter_function.filter_batch(columns).tolist(), mask_gt)
+                self.assertEqual([filter_function(sample) for sample in lst_samples], mask_gt)
+
+    def test_dataset_filter_consistency(self):
+
+        for filter_name, filter_function in self._filters.items():
+            with self.subTest(filter_name=filter_name):
+                # plain callable doesn't have `filter_batch()`, then the filter is evaluated sample by sample.
+                kwargs = self._filter_args[filter_name]
+                dataset = self._load(filter=filter_function)
+                dataset_gt = self._load(filter=lambda sample: self._filter_baseline(sample, **kwargs))
+                self.assertEqual(list(dataset), list(dataset_gt))
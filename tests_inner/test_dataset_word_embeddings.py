@@ -10,10 +10,14 @@ warnings.simplefilter("always")
 
 import numpy as np
 import sys, io, os
+import tempfile
+import gc, weakref
 from typing import List, Dict, Optional
 from collections.abc import Callable
 import unittest
+import torch
 from dataset.word_embeddings import Word2VecDataset, FastTextDataset, GeneralPurposeEmbeddingsDataset
+from dataset.matrix_cache import open_matrix_cache
 from config_files.word_embeddings import DIR_WORD_EMBEDDINGS
 
 class BaseValidator(unittest.TestCase):
@@ -171,4 +175,105 @@ class FastTextTestCases(unittest.TestCase):
         vec_e = self._dataset.encode_phrase(phrase)
         vec_e_gt = np.sum([self._dataset.encode(token) for token in lst_tokens], axis=0) / len(lst_tokens)
 
-        self.assertTrue(np.allclose(vec_e, vec_e_gt))
\ No newline at end of file
+        self.assertTrue(np.allclose(vec_e, vec_e_gt))
+
+
+class GeneralPurposeEmbeddingsTestCases(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._tempdir = tempfile.TemporaryDirectory()
+        self._path_embeddings = os.path.join(self._tempdir.name, "embeddings.npy")
+        self._path_vocabulary = os.path.join(self._tempdir.name, "vocabulary.txt")
+        self._path_cache = os.path.join(self._tempdir.name, "embeddings.cache")
+
+        self._lst_entities = ["entity_" + str(idx) for idx in range(23)]
+        self._embedding = np.random.RandomState(0).normal(size=(len(self._lst_entities), 5)).astype(np.float32)
+        np.save(self._path_embeddings, self._embedding)
+        with io.open(self._path_vocabulary, mode="w") as ofs:
+            ofs.write("\n".join(self._lst_entities) + "\n")
+
+    def tearDown(self) -> None:
+        self._tempdir.cleanup()
+
+    def _create_dataset(self, path_matrix_cache=None):
+        return GeneralPurposeEmbeddingsDataset(path_numpy_array_binary_format=self._path_embeddings,
+                                               path_vocabulary_text=self._path_vocabulary,
+                                               path_matrix_cache=path_matrix_cache)
+
+    def test_get_embeddings_round_trip(self):
+
+        lst_entities = self._lst_entities[::-3]
+        vec_e_gt = self._create_dataset().get_embeddings(lst_entities)
+        self.assertTrue(np.array_equal(vec_e_gt, self._embedding[::-3]))
+
+        # first one builds the cache, second one loads it.
+        for trial in range(2):
+            with self.subTest(trial=trial):
+                dataset = self._create_dataset(path_matrix_cache=self._path_cache)
+                self.assertTrue(np.array_equal(dataset.get_embeddings(lst_entities), vec_e_gt))
+
+    def test_rebuild_on_model_change(self):
+
+        self._create_dataset(path_matrix_cache=self._path_cache)
+
+        # same shape, different values and modification time
+        np.save(self._path_embeddings, -self._embedding)
+        stat = os.stat(self._path_embeddings)
+        os.utime(self._path_embeddings, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        dataset = self._create_dataset(path_matrix_cache=self._path_cache)
+        self.assertTrue(np.array_equal(dataset.get_embeddings(self._lst_entities), -self._embedding))
+
+    def test_rebuild_on_fingerprint_mismatch(self):
+
+        shape = self._embedding.shape
+        fill_function = lambda begin, end: self._embedding[begin:end]
+        mat_cache = open_matrix_cache(self._path_cache, shape=shape, fill_function=fill_function, fingerprint="a", chunk_size=4)
+        self.assertTrue(np.array_equal(mat_cache, self._embedding))
+
+        # same fingerprint: fill function must not be called.
+        def _fail(begin, end):
+            raise AssertionError("cache must be reused.")
+        mat_cache = open_matrix_cache(self._path_cache, shape=shape, fill_function=_fail, fingerprint="a")
+        self.assertTrue(np.array_equal(mat_cache, self._embedding))
+
+        # different fingerprint: cache is rebuilt.
+        fill_function = lambda begin, end: 2.0 * self._embedding[begin:end]
+        mat_cache = open_matrix_cache(self._path_cache, shape=shape, fill_function=fill_function, fingerprint="b")
+        self.assertTrue(np.array_equal(mat_cache, 2.0 * self._embedding))
+
+    def test_get_embeddings_tensor_dtype(self):
+
+        # float64 model: with or without `out`, embeddings must be the same float32 tensor.
+        np.save(self._path_embeddings, self._embedding.astype(np.float64))
+        lst_entities = self._lst_entities[::-3]
+
+        for share_matrix_cache in (False, True):
+            dataset = self._create_dataset(path_matrix_cache=self._path_cache if share_matrix_cache else None)
+            if share_matrix_cache:
+                dataset.share_matrix_cache()
+            with self.subTest(share_matrix_cache=share_matrix_cache):
+                t_embeddings = dataset.get_embeddings_tensor(lst_entities)
+                out = torch.empty((len(lst_entities), dataset.n_dim), dtype=torch.float32)
+                t_embeddings_out = dataset.get_embeddings_tensor(lst_entities, out=out)
+
+                self.assertEqual(t_embeddings.dtype, torch.float32)
+                self.assertEqual(t_embeddings_out.dtype, torch.float32)
+                self.assertTrue(torch.equal(t_embeddings, t_embeddings_out))
+                vec_e_gt = dataset.get_embeddings(lst_entities).astype(np.float32)
+                self.assertTrue(np.array_equal(t_embeddings.numpy(), vec_e_gt))
+
+    def test_encodable_phrase_cache(self):
+
+        dataset = self._create_dataset()
+        dataset_other = self._create_dataset()
+        self.assertTrue(dataset.is_encodable(self._lst_entities[0]))
+        self.assertFalse(dataset.is_encodable("unknown_entity"))
+        self.assertEqual(dataset._encodable_phrase_cache, {"unknown_entity":False})
+        self.assertEqual(dataset_other._encodable_phrase_cache, {})
+
+        # cache must not keep the instance alive.
+        ref = weakref.ref(dataset)
+        del dataset
+        gc.collect()
+        self.assertIsNone(ref())
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import unittest
+import numpy as np
+import torch
+from torch.nn import functional as F
+from model.encoder import SimpleEncoder
+
+
+class SimpleEncoderTestCases(unittest.TestCase):
+
+    def setUp(self) -> None:
+
+        torch.manual_seed(0)
+        self._n_dim_emb = 16
+        self._n_digits = 4
+        self._n_ary = 6
+        self._input_x = torch.randn(8, self._n_dim_emb)
+        self._encoder = SimpleEncoder(n_dim_emb=self._n_dim_emb, n_digits=self._n_digits, n_ary=self._n_ary)
+
+    def _code_probability_baseline(self, encoder, input_x):
+        # softmax over log(softplus(z)) of each digit.
+        t_h = torch.tanh(encoder.x_to_h(input_x))
+        t_z = encoder.h_to_z(t_h).view(-1, self._n_digits, self._n_ary)
+        return F.softmax(torch.log(F.softplus(t_z)), dim=-1)
+
+    def test_code_probability_fp32(self):
+
+        expected = self._code_probability_baseline(self._encoder, self._input_x)
+        actual = self._encoder(self._input_x)
+
+        self.assertEqual(actual.dtype, torch.float32)
+        self.assertEqual(actual.shape, (8, self._n_digits, self._n_ary))
+        self.assertTrue(np.allclose(expected.detach().numpy(), actual.detach().numpy(), atol=1E-6))
+
+    def test_code_probability_bf16_autocast(self):
+
+        encoder = SimpleEncoder(n_dim_emb=self._n_dim_emb, n_digits=self._n_digits, n_ary=self._n_ary, autocast_dtype=torch.bfloat16)
+        encoder.load_state_dict(self._encoder.state_dict())
+
+        lst_dtypes = []
+        encoder.h_to_z.register_forward_hook(lambda module, inputs, output: lst_dtypes.append(output.dtype))
+
+        expected = self._code_probability_baseline(self._encoder, self._input_x)
+        actual = encoder(self._input_x)
+
+        # linear layers run in bfloat16, whereas code probability is normalized in float32 regardless of the autocast dtype.
+        self.assertEqual(lst_dtypes, [torch.bfloat16])
+        self.assertEqual(actual.dtype, torch.float32)
+        self.assertTrue(np.allclose(actual.sum(dim=-1).detach().numpy(), 1.0, atol=1E-6))
+        self.assertTrue(np.allclose(expected.detach().numpy(), actual.detach().numpy(), atol=2E-2))
+
+        # gradient flows through the autocast region.
+        actual[...,0].sum().backward()
+        self.assertTrue(torch.isfinite(encoder.x_to_h.weight.grad).all())
@@ -85,6 +85,29 @@ class HyponymyScoreLossLayer(unittest.TestCase):
 
         self.assertTrue(np.allclose(expected, actual))
 
+    def test_intensity_to_probability_gradient(self):
+
+        # intensity close to one must propagate the gradient as well.
+        t_test = torch.cat((self._t_arry_p_x[:,:,0], torch.tensor([[1.0, 0.5, 1.0-1E-8, 0.2]], dtype=self._t_arry_p_x.dtype)[:,:self._n_digits]))
+
+        def _intensity_to_probability_baseline(t_intensity):
+            n_digits = t_intensity.shape[-1]
+            lst_prob = []
+            t_survival = torch.ones_like(t_intensity[...,0])
+            for digit in range(n_digits):
+                lst_prob.append(t_survival * t_intensity[...,digit])
+                t_survival = t_survival * (1.0 - t_intensity[...,digit])
+            lst_prob.append(t_survival)
+            return torch.stack(lst_prob, dim=-1)
+
+        t_weight = torch.arange(self._n_digits+1, dtype=t_test.dtype)
+        t_x = t_test.clone().requires_grad_()
+        expected, = torch.autograd.grad(torch.sum(_intensity_to_probability_baseline(t_x)*t_weight), t_x)
+        t_x = t_test.clone().requires_grad_()
+        actual, = torch.autograd.grad(torch.sum(self._loss_layer._intensity_to_probability(t_x)*t_weight), t_x)
+
+        self.assertTrue(np.allclose(expected.numpy(), actual.numpy()))
+
     def test_soft_code_length(self):
 
         t_test = self._t_arry_p_x
@@ -170,6 +193,100 @@ class HyponymyScoreLossLayer(unittest.TestCase):
 
         self.assertTrue(np.allclose(expected, actual))
 
+    def test_loss_value_array_input(self):
+
+        t_test = self._t_arry_p_batch
+        lst_train = self._hyponymy_tuples
+        arry_train = np.array(lst_train)
+
+        expected = self._loss_layer.forward(t_test, lst_train).item()
+        actual = self._loss_layer.forward(t_test, arry_train).item()
+
+        self.assertTrue(np.allclose(expected, actual))
+        # input array must not be modified.
+        self.assertTrue(np.array_equal(arry_train, np.array(lst_train)))
+
+    def test_loss_value_collated_input(self):
+
+        t_test = self._t_arry_p_batch
+        lst_train = self._hyponymy_tuples
+        tup_collated = self._loss_layer.collate_hyponymy_tuples(lst_train)
+        t_values = tup_collated[-1].clone()
+
+        expected = self._loss_layer.forward(t_test, lst_train).item()
+        actual = self._loss_layer.forward(t_test, tup_collated).item()
+
+        self.assertTrue(np.allclose(expected, actual))
+        # collated tensors must not be modified.
+        self.assertTrue(torch.equal(t_values, tup_collated[-1]))
+
+    def test_hinge_distance_reduction_changed_at_runtime(self):
+
+        loss_layer = HyponymyScoreLoss(distance_metric="hinge")
+        y_pred = torch.tensor([1.0, -1.0, 2.0])
+        y_true = torch.zeros(3)
+
+        loss_layer.reduction = "none"
+        actual = loss_layer._func_distance(y_pred, y_true)
+        self.assertTrue(torch.equal(torch.tensor([1.0, 0.0, 2.0]), actual))
+
+        loss_layer.reduction = "sum"
+        actual = loss_layer._func_distance(y_pred, y_true)
+        self.assertAlmostEqual(3.0, actual.item())
+
+    def test_auto_scaled_mse_single_pair_gradient(self):
+
+        # scaled mse fallback is undefined for single pair. it must not affect the gradient when the optimal scale is positive.
+        loss_layer = HyponymyScoreLoss(distance_metric="autoscaled-mse")
+        t_u = torch.tensor([2.0], dtype=torch.float64, requires_grad=True)
+        t_v = torch.tensor([1.0], dtype=torch.float64)
+
+        loss = loss_layer._func_distance(t_u, t_v)
+        grad, = torch.autograd.grad(loss, t_u)
+
+        self.assertTrue(torch.isfinite(loss).all())
+        self.assertTrue(torch.isfinite(grad).all())
+
+    def test_batchnorm_mse(self):
+
+        loss_layer = HyponymyScoreLoss(distance_metric="batchnorm-mse")
+        t_u = torch.tensor([1.0, -1.0, 2.0, 0.5], dtype=torch.float64)
+        t_v = torch.tensor([0.0, -4.0, 1.0, 3.0], dtype=torch.float64)
+
+        # baseline: batch normalization without affine transform over the concatenation of u and v.
+        def _batchnorm_mse_baseline(u, v):
+            batchnorm = torch.nn.BatchNorm1d(1, affine=False).to(dtype=u.dtype)
+            t_uv = batchnorm(torch.cat((u, v)).unsqueeze(-1)).squeeze(-1)
+            return torch.mean((t_uv[:len(u)] - t_uv[len(u):])**2)
+
+        t_u_e, t_v_e = t_u.clone().requires_grad_(), t_v.clone().requires_grad_()
+        expected = _batchnorm_mse_baseline(t_u_e, t_v_e)
+        expected_grads = torch.autograd.grad(expected, (t_u_e, t_v_e))
+
+        t_u_a, t_v_a = t_u.clone().requires_grad_(), t_v.clone().requires_grad_()
+        actual = loss_layer._func_distance(t_u_a, t_v_a)
+        actual_grads = torch.autograd.grad(actual, (t_u_a, t_v_a))
+
+        self.assertAlmostEqual(expected.item(), actual.item())
+        for expected_grad, actual_grad in zip(expected_grads, actual_grads):
+            self.assertTrue(np.allclose(expected_grad.numpy(), actual_grad.numpy()))
+
+    def test_loss_value_tensor_input(self):
+
+        t_test = self._t_arry_p_batch
+        lst_train = self._hyponymy_tuples
+        t_idx_x = torch.tensor([tup[0] for tup in lst_train], dtype=torch.long)
+        t_idx_y = torch.tensor([tup[1] for tup in lst_train], dtype=torch.long)
+        y_true = torch.tensor([tup[2] for tup in lst_train], dtype=t_test.dtype)
+        y_true_orig = y_true.clone()
+
+        expected = self._loss_layer.forward(t_test, lst_train).item()
+        actual = self._loss_layer.forward_t(t_test, t_idx_x, t_idx_y, y_true).item()
+
+        self.assertTrue(np.allclose(expected, actual))
+        # ground-truth tensor must not be modified.
+        self.assertTrue(torch.equal(y_true_orig, y_true))
+
 
 class EntailmentProbabilityLossLayer(unittest.TestCase):
 
@@ -11,6 +11,7 @@ import unittest
 import networkx as nx
 import numpy as np
 from dataset.taxonomy import BasicTaxonomy, WordNetTaxonomy
+from dataset.taxonomy import njit, _sample_non_hyponymy_kernel, _sample_non_hyponymy_vectorized
 from dataset.lexical_knowledge import HyponymyDataset, WordNetHyponymyDataset
 from dataset.transform import FieldTypeConverter
 from config_files.lexical_knowledge_datasets_original import cfg_hyponymy_relation_datasets
@@ -187,6 +188,109 @@ class BasicTaxonomyTestCases(unittest.TestCase):
             with self.subTest(hypernym=entity):
                 self.assertTrue(set(pred).issubset(gt))
 
+    def test_sample_non_hyponymy_batch(self):
+
+        all_entities = set(self._taxonomy.dag.nodes)
+        entities = sorted(all_entities) + ["P"]
+        size = 20
+
+        for exclude_hypernyms in (True, False):
+            lst_pred = self._taxonomy.sample_non_hyponymy_batch(entities, size=size, exclude_hypernyms=exclude_hypernyms)
+            self.assertEqual(len(entities), len(lst_pred))
+            for entity, pred in zip(entities, lst_pred):
+                with self.subTest(entity=entity, exclude_hypernyms=exclude_hypernyms):
+                    # unknown entity
+                    if entity not in all_entities:
+                        self.assertEqual(len(pred), 0)
+                        continue
+                    gt = all_entities - self._taxonomy.hyponyms(entity) - set(entity)
+                    if exclude_hypernyms:
+                        gt = gt - self._taxonomy.hypernyms(entity)
+                    self.assertEqual(len(pred), size)
+                    self.assertTrue(set(pred).issubset(gt))
+
+    def test_sample_non_hyponymy_batch_reproducible(self):
+
+        entities = sorted(self._taxonomy.dag.nodes)
+
+        np.random.seed(0)
+        expected = self._taxonomy.sample_non_hyponymy_batch(entities, size=5)
+        np.random.seed(0)
+        actual = self._taxonomy.sample_non_hyponymy_batch(entities, size=5)
+
+        self.assertListEqual(expected, actual)
+
+    def test_sample_non_hyponymy_batch_dense(self):
+
+        # "R" excludes 19 out of 21 nodes, then it is sampled from the explicit candidates.
+        edges = "\n".join([f"R,C{idx},1" for idx in range(18)] + ["X,Y,1"])
+        tmp = tempfile.NamedTemporaryFile(prefix="edges", mode="w")
+        tmp.write(edges)
+        tmp.flush()
+        cfg = {
+            "path":tmp.name,
+            "header":False,
+            "delimiter":",",
+            "columns":{"hypernym":0, "hyponym":1, "distance":2},
+            "lowercase":False,
+            "transform":_distance_str_to_float
+        }
+        taxonomy = BasicTaxonomy(hyponymy_dataset=HyponymyDataset(**cfg))
+        tmp.close()
+
+        pred, = taxonomy.sample_non_hyponymy_batch(["R"], size=100, exclude_hypernyms=True)
+        self.assertEqual(len(pred), 100)
+        self.assertTrue(set(pred).issubset({"X","Y"}))
+
+    @unittest.skipIf(njit is None, "numba is not installed.")
+    def test_sample_non_hyponymy_kernel(self):
+
+        # compiled kernel and numpy fallback draw from different random streams, so that the samples are compared
+        # by its validity and empirical distribution. kernel itself must be reproducible with the fixed seed.
+        node_to_id, arry_nodes, indptr, indices = self._taxonomy.non_hyponymy_index(exclude_hypernyms=True)
+        n_nodes = len(arry_nodes)
+        query_ids = np.array([node_id for node_id in range(n_nodes) if indptr[node_id+1] - indptr[node_id] < n_nodes], dtype=np.int64)
+        size = 2000
+
+        out_kernel = np.full((len(query_ids), size), -1, dtype=np.int64)
+        _sample_non_hyponymy_kernel(query_ids, indptr, indices, n_nodes, size, 0, out_kernel)
+        out_kernel_again = np.full((len(query_ids), size), -1, dtype=np.int64)
+        _sample_non_hyponymy_kernel(query_ids, indptr, indices, n_nodes, size, 0, out_kernel_again)
+        self.assertTrue(np.array_equal(out_kernel, out_kernel_again))
+
+        np.random.seed(0)
+        out_vectorized = np.full((len(query_ids), size), -1, dtype=np.int64)
+        _sample_non_hyponymy_vectorized(query_ids, indptr, indices, n_nodes, size, out_vectorized)
+
+        for i, query_id in enumerate(query_ids):
+            excluded_ids = set(indices[indptr[query_id]:indptr[query_id+1]].tolist())
+            candidate_ids = sorted(set(range(n_nodes)) - excluded_ids)
+            with self.subTest(entity=arry_nodes[query_id]):
+                for out in (out_kernel, out_vectorized):
+                    self.assertTrue(set(out[i].tolist()).issubset(candidate_ids))
+                    # both must be uniform over the candidates.
+                    freq = np.bincount(out[i], minlength=n_nodes)[candidate_ids] / size
+                    self.assertTrue(np.allclose(freq, 1.0 / len(candidate_ids), atol=0.05))
+
+    def test_sample_non_hyponymy_batch_empty_taxonomy(self):
+
+        # no direct hyponymy pair, hence no node can be sampled.
+        tmp = tempfile.NamedTemporaryFile(prefix="edges", mode="w")
+        tmp.write("A,B,2\n")
+        tmp.flush()
+        cfg = {
+            "path":tmp.name,
+            "header":False,
+            "delimiter":",",
+            "columns":{"hypernym":0, "hyponym":1, "distance":2},
+            "lowercase":False,
+            "transform":_distance_str_to_float
+        }
+        taxonomy = BasicTaxonomy(hyponymy_dataset=HyponymyDataset(**cfg))
+        tmp.close()
+
+        self.assertEqual(taxonomy.sample_non_hyponymy_batch(["A", "Z"], size=3), [tuple(), tuple()])
+
 
 class WordNetTaxonomyTestCases(unittest.TestCase):
 
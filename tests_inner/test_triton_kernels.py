@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import unittest
+import torch
+from torch.nn import functional as F
+from model import triton_kernels
+from model.loss_supervised import HyponymyScoreLoss
+
+
+@unittest.skipIf(not (torch.cuda.is_available() and triton_kernels.is_available()), "CUDA and triton are required.")
+class TritonKernelsTestCases(unittest.TestCase):
+
+    _device = "cuda"
+
+    def setUp(self) -> None:
+        # non power-of-two sizes so that both padded rows and padded digits are examined.
+        self._n_batch = 37
+        self._n_digits = 7
+        self._n_ary = 6
+        self._generator = torch.Generator().manual_seed(0)
+        self._loss_layer = HyponymyScoreLoss(use_triton=False)
+
+    def _random_code_probability(self) -> torch.Tensor:
+        t_logits = torch.randn((self._n_batch, self._n_digits, self._n_ary), generator=self._generator)
+        return F.softmax(t_logits, dim=-1).to(self._device).requires_grad_()
+
+    def _forward_and_backward(self, function, *inputs):
+        t_output = function(*inputs)
+        t_grad_output = torch.randn(t_output.shape, generator=self._generator).to(self._device)
+        lst_grads = torch.autograd.grad(t_output, inputs, t_grad_output)
+        return t_output, lst_grads, t_grad_output
+
+    def test_soft_code_length(self):
+
+        t_prob_c = self._random_code_probability()
+        # t_prob_c[...,0] is the strided input. it is passed without copy.
+        t_length, (t_grad,), t_grad_output = self._forward_and_backward(lambda t: triton_kernels.soft_code_length_triton(t[...,0]), t_prob_c)
+
+        t_length_gt = self._loss_layer.calc_soft_code_length(t_prob_c)
+        t_grad_gt, = torch.autograd.grad(t_length_gt, t_prob_c, t_grad_output)
+
+        self.assertEqual(t_length.shape, (self._n_batch,))
+        self.assertTrue(torch.allclose(t_length, t_length_gt, atol=1E-5))
+        self.assertTrue(torch.allclose(t_grad, t_grad_gt, atol=1E-5))
+
+    def test_ancestor_probability(self):
+
+        t_prob_c_x = self._random_code_probability()
+        t_prob_c_y = self._random_code_probability()
+        t_prob, (t_grad_x, t_grad_y), t_grad_output = self._forward_and_backward(triton_kernels.ancestor_probability_triton, t_prob_c_x, t_prob_c_y)
+
+        t_prob_gt = self._loss_layer.calc_ancestor_probability(t_prob_c_x, t_prob_c_y)
+        t_grad_x_gt, t_grad_y_gt = torch.autograd.grad(t_prob_gt, (t_prob_c_x, t_prob_c_y), t_grad_output)
+
+        self.assertEqual(t_prob.shape, (self._n_batch,))
+        self.assertTrue(torch.allclose(t_prob, t_prob_gt, atol=1E-5))
+        self.assertTrue(torch.allclose(t_grad_x, t_grad_x_gt, atol=1E-5))
+        self.assertTrue(torch.allclose(t_grad_y, t_grad_y_gt, atol=1E-5))